@@ -2,52 +2,354 @@
 """
 Hatchmark Local Development Server
 Provides mock API endpoints for local development
+
+When gevent is installed the server runs on gevent's WSGI server so slow
+AWS calls don't block other clients. It can also be run under gunicorn:
+    gunicorn -k gevent -w 1 --worker-connections 1000 -b 0.0.0.0:3002 local_dev_server:app
+(python serve.py does this with sensible defaults).
+Set USE_DEV_SERVER=1 to use Flask's reloader/debugger instead.
 """
 
+try:
+    # Must run before anything imports socket/ssl (boto3, werkzeug)
+    import gevent
+    from gevent import monkey
+    monkey.patch_all()
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
+
+import io
 import os
 import sys
 import uuid
 import json
 import time
-import re
+import hmac
+import hashlib
+import queue
 import logging
+import threading
 from datetime import datetime, timezone
-from flask import Flask, request, jsonify
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from PIL import Image
+import imagehash
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+if orjson:
+    app.json = OrjsonProvider(app)
 CORS(app)
 
+def request_json():
+    """Parse the request body as JSON; None if it is missing or malformed"""
+    body = request.get_data(cache=False)
+    if not body:
+        return None
+    try:
+        return orjson.loads(body) if orjson else json.loads(body)
+    except ValueError:
+        return None
+
+def json_bytes(obj):
+    """Encode obj as JSON bytes (orjson when available)"""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
 # Configuration
 INGESTION_BUCKET = "hatchmark-ingestion-bucket-36933227"
 PROCESSED_BUCKET = "hatchmark-processed-bucket-36933227"
 AWS_PROFILE = "hatchmark-dev"
+AWS_REGION = "eu-west-1"
+ASSETS_TABLE = "hatchmark-assets"
+
+# Fixed prefixes for upload URLs and object keys built on every initiate
+LOCAL_UPLOAD_URL_PREFIX = "http://localhost:3002/uploads/file/"
+UPLOAD_KEY_PREFIX = "uploads/"
+
+# Read size for streaming uploaded file bodies
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-# Mock data storage
+# Mock data storage. Upload records are never mutated in place: updates swap in
+# a new record under _uploads_lock, so a reader serializing one never sees it
+# change mid-iteration.
 mock_uploads = {}
+upload_ids_by_object_key = {}
+_uploads_lock = threading.Lock()
+
+# The asset registry and its lookup indexes are copy-on-write snapshots:
+# readers use whichever dicts are currently bound without locking, and
+# writers build new dicts under _registry_lock and swap them in.
 mock_assets = {}
+mock_by_asset_id = {}
+mock_by_filename = {}
+_registry_lock = threading.Lock()
+
+# Bumped on every registry write; GET /ledger caches its encoded body per version
+_ledger_version = 0
+_ledger_cache = (-1, b'')
+# Per-process prefix for ledger ETags so versions from another worker or an
+# earlier run of the server never validate against this registry
+_ledger_etag_prefix = uuid.uuid4().hex[:8]
+
+def register_asset(perceptual_hash, asset_record):
+    """Store an asset in the mock registry and keep its lookup indexes in sync"""
+    global mock_assets, mock_by_asset_id, mock_by_filename, _ledger_version
+    with _registry_lock:
+        assets = dict(mock_assets)
+        by_asset_id = dict(mock_by_asset_id)
+        by_filename = dict(mock_by_filename)
+        
+        previous = assets.get(perceptual_hash)
+        if previous is not None:
+            by_asset_id.pop(previous.get('assetId'), None)
+            previous_filename = previous.get('filename', '').lower()
+            if by_filename.get(previous_filename) is previous:
+                del by_filename[previous_filename]
+        
+        assets[perceptual_hash] = asset_record
+        by_asset_id[asset_record['assetId']] = asset_record
+        if asset_record.get('filename'):
+            by_filename[asset_record['filename'].lower()] = asset_record
+        
+        mock_assets, mock_by_asset_id, mock_by_filename = assets, by_asset_id, by_filename
+        _ledger_version += 1
+
+def update_upload(upload_id, **fields):
+    """Replace an upload record with an updated copy; returns None if unknown"""
+    with _uploads_lock:
+        upload_info = mock_uploads.get(upload_id)
+        if upload_info is None:
+            return None
+        upload_info = {**upload_info, **fields}
+        mock_uploads[upload_id] = upload_info
+        return upload_info
+
+def find_asset(query):
+    """Find an asset by ID or filename, falling back to a partial filename match"""
+    query_lower = query.lower()
+    asset = mock_by_asset_id.get(query) or mock_by_filename.get(query_lower)
+    if asset is not None:
+        return asset
+    
+    for filename, asset in mock_by_filename.items():
+        if query_lower in filename:
+            return asset
+    return None
 
+@lru_cache(maxsize=1)
 def get_aws_session():
-    """Get AWS session with profile"""
+    """Get AWS session with profile (built once and reused across requests)"""
     try:
         return boto3.Session(profile_name=AWS_PROFILE)
     except Exception as e:
         logger.warning(f"AWS session failed: {e}")
         return None
 
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """Get a shared S3 client for the AWS session"""
+    session = get_aws_session()
+    if not session:
+        return None
+    return session.client('s3', config=Config(signature_version='s3v4', max_pool_connections=64))
+
+@lru_cache(maxsize=1)
+def get_assets_table():
+    """Get a shared DynamoDB table resource for the asset ledger"""
+    session = get_aws_session()
+    if not session:
+        return None
+    return session.resource('dynamodb').Table(ASSETS_TABLE)
+
+class LedgerBatchWriter:
+    """Coalesces PutItem calls from concurrent requests into BatchWriteItem calls"""
+
+    def __init__(self, table, max_batch=25, max_wait=0.02):
+        self.table = table
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='ledger-batch-writer', daemon=True)
+        self._worker.start()
+
+    def put_item(self, item):
+        """Queue an item and block until the batch containing it is written"""
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                with self.table.batch_writer() as writer:
+                    for item, _ in batch:
+                        writer.put_item(Item=item)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for _, future in batch:
+                    future.set_result(None)
+
+@lru_cache(maxsize=1)
+def get_ledger_writer():
+    """Get the shared batching writer for the asset ledger table"""
+    table = get_assets_table()
+    if not table:
+        return None
+    return LedgerBatchWriter(table)
+
+# phash only keeps a 32x32 thumbnail, so large images are shrunk to this
+# working size first (JPEGs while decoding) rather than resampled at full size
+PHASH_WORKING_SIZE = (256, 256)
+
+def phash_image(image):
+    """Perceptual hash of an opened image, computed from a capped working copy"""
+    image.draft('L', PHASH_WORKING_SIZE)
+    image.thumbnail(PHASH_WORKING_SIZE, Image.BILINEAR)
+    return str(imagehash.phash(image))
+
+def _phash_bytes(image_data):
+    """Compute the perceptual hash of encoded image bytes (runs in a worker)"""
+    return phash_image(Image.open(io.BytesIO(image_data)))
+
+# Image decode + DCT is CPU-bound; keep it off the request thread. Under
+# gevent a native thread keeps the hub serving (forking after monkey
+# patching is unreliable); otherwise use worker processes to sidestep the GIL.
+_phash_pool = None if GEVENT_AVAILABLE else ProcessPoolExecutor(max_workers=os.cpu_count())
+
+def compute_phash(image_data):
+    """Compute the perceptual hash of encoded image bytes in a worker"""
+    if GEVENT_AVAILABLE:
+        return gevent.get_hub().threadpool.apply(_phash_bytes, (image_data,))
+    return _phash_pool.submit(_phash_bytes, image_data).result()
+
+def fallback_hash(value):
+    """Stable 64-bit registry key for assets without a perceptual hash"""
+    return f"hash_{hashlib.blake2b(value.encode(), digest_size=8).hexdigest()}"
+
+# Timestamps are formatted from a date/time prefix rendered at most once per
+# second. Response timestamps use second resolution; stored records append the
+# microseconds so they keep full precision.
+_now_iso_cache = (0, '', '')
+
+def _now_iso_parts(seconds):
+    """Get the cached (seconds, prefix, second-resolution ISO string) entry"""
+    global _now_iso_cache
+    cached = _now_iso_cache
+    if cached[0] != seconds:
+        prefix = datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        cached = (seconds, prefix, prefix + '+00:00')
+        _now_iso_cache = cached
+    return cached
+
+def utc_now_iso():
+    """Get the current UTC time as a second-resolution ISO 8601 string"""
+    return _now_iso_parts(int(time.time()))[2]
+
+def utc_now_iso_precise():
+    """Get the current UTC time as an ISO 8601 string, same format as datetime.isoformat()"""
+    seconds, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached = _now_iso_parts(seconds)
+    if not micros:
+        return cached[2]
+    return f"{cached[1]}.{micros:06d}+00:00"
+
+# SigV4 presigning for the fixed PUT shape used by initiate_upload
+_S3_HOST = f"{INGESTION_BUCKET}.s3.{AWS_REGION}.amazonaws.com"
+_SIGNED_HEADERS = "content-type;host"
+_signing_keys = {}
+
+def _signing_key(secret_key, date_stamp):
+    """Derive (and cache per day) the SigV4 signing key for S3"""
+    cache_key = (secret_key, date_stamp)
+    key = _signing_keys.get(cache_key)
+    if key is None:
+        key = hmac.new(f"AWS4{secret_key}".encode(), date_stamp.encode(), hashlib.sha256).digest()
+        for part in (AWS_REGION, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        _signing_keys.clear()
+        _signing_keys[cache_key] = key
+    return key
+
+def _presign_put(object_key, content_type, expires, credentials, now=None):
+    """Build a SigV4 presigned PUT URL without going through botocore"""
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = amz_date[:8]
+    scope = f"{date_stamp}/{AWS_REGION}/s3/aws4_request"
+
+    params = {
+        'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+        'X-Amz-Credential': f"{credentials.access_key}/{scope}",
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expires),
+        'X-Amz-SignedHeaders': _SIGNED_HEADERS,
+    }
+    if credentials.token:
+        params['X-Amz-Security-Token'] = credentials.token
+    query = '&'.join(f"{k}={quote(v, safe='-_.~')}" for k, v in sorted(params.items()))
+    path = '/' + quote(object_key, safe='/-_.~')
+
+    canonical_request = (
+        f"PUT\n{path}\n{query}\n"
+        f"content-type:{content_type}\nhost:{_S3_HOST}\n\n"
+        f"{_SIGNED_HEADERS}\nUNSIGNED-PAYLOAD"
+    )
+    string_to_sign = (
+        f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+        f"{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+    )
+    signature = hmac.new(
+        _signing_key(credentials.secret_key, date_stamp), string_to_sign.encode(), hashlib.sha256
+    ).hexdigest()
+    return f"https://{_S3_HOST}{path}?{query}&X-Amz-Signature={signature}"
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'hatchmark-local-dev',
-        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'timestamp': utc_now_iso(),
         'version': '1.0.0'
     })
 
@@ -56,88 +358,51 @@ def initiate_upload():
     """Initiate file upload with presigned URL"""
     try:
         logger.info(f"Upload initiation request received: {request.method}")
-        data = request.get_json()
+        data = request_json()
         logger.info(f"Request data: {data}")
         
         if not data or 'filename' not in data:
             logger.error("Missing filename in request")
             return jsonify({'error': 'filename is required'}), 400
         
-        filename = data['filename']
-        if not filename.strip():
+        filename = data['filename'].strip()
+        if not filename:
             return jsonify({'error': 'filename cannot be empty'}), 400
         
         file_size = data.get('fileSize', 0)
         content_type = data.get('contentType', '')
         
-        upload_id = str(uuid.uuid4())
-        object_key = f"uploads/{upload_id}/{filename}"
+        upload_id = uuid.uuid4().hex
+        object_key = UPLOAD_KEY_PREFIX + upload_id + "/" + filename
         
         LOCAL_DEV_MODE = True
         
-        if LOCAL_DEV_MODE:
-            local_upload_url = f"http://localhost:3002/uploads/file/{upload_id}"
-            
-            mock_uploads[upload_id] = {
-                'uploadId': upload_id,
-                'filename': filename,
-                'objectKey': object_key,
-                'status': 'initiated',
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            }
-            
-            logger.info(f"Generated local upload URL: {local_upload_url}")
-            
-            return jsonify({
-                'uploadUrl': local_upload_url,
-                'objectKey': object_key,
-                'uploadId': upload_id
-            })
-        
-        session = get_aws_session()
-        if session:
-            try:
-                s3_client = session.client('s3')
-                presigned_url = s3_client.generate_presigned_url(
-                    'put_object',
-                    Params={
-                        'Bucket': INGESTION_BUCKET,
-                        'Key': object_key,
-                        'ContentType': 'image/*'
-                    },
-                    ExpiresIn=600
-                )
-                
-                # Store upload info
-                mock_uploads[upload_id] = {
-                    'uploadId': upload_id,
-                    'filename': filename,
-                    'objectKey': object_key,
-                    'status': 'initiated',
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
-                
-                return jsonify({
-                    'uploadUrl': presigned_url,
-                    'objectKey': object_key,
-                    'uploadId': upload_id
-                })
-                
-            except Exception as e:
-                logger.warning(f"Real S3 presigned URL failed: {e}")
+        upload_url = None
+        if not LOCAL_DEV_MODE:
+            session = get_aws_session()
+            if session:
+                try:
+                    credentials = session.get_credentials().get_frozen_credentials()
+                    upload_url = _presign_put(object_key, 'image/*', 600, credentials)
+                except Exception as e:
+                    logger.warning(f"Real S3 presigned URL failed: {e}")
         
-        local_upload_url = f"http://localhost:3002/uploads/file/{upload_id}"
+        if upload_url is None:
+            upload_url = LOCAL_UPLOAD_URL_PREFIX + upload_id
+            logger.info(f"Generated local upload URL: {upload_url}")
         
+        # Store upload info
         mock_uploads[upload_id] = {
             'uploadId': upload_id,
             'filename': filename,
             'objectKey': object_key,
             'status': 'initiated',
-            'timestamp': datetime.now(timezone.utc).isoformat()
+            'timestamp': utc_now_iso_precise()
         }
+        upload_ids_by_object_key[object_key] = upload_id
         
         return jsonify({
-            'uploadUrl': local_upload_url,
+            'uploadUrl': upload_url,
             'objectKey': object_key,
             'uploadId': upload_id
         })
@@ -152,30 +417,41 @@ def upload_file_local(upload_id):
     try:
         logger.info(f"Local file upload request for upload_id: {upload_id}")
         
-        if upload_id not in mock_uploads:
+        upload_info = mock_uploads.get(upload_id)
+        if upload_info is None:
             return jsonify({'error': 'Upload not found'}), 404
         
-        file_data = request.get_data()
+        stream = request.stream
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
         
-        if not file_data:
+        if not chunk:
             return jsonify({'error': 'No file data provided'}), 400
         
-        import os
         uploads_dir = '/tmp/hatchmark-uploads'
         os.makedirs(uploads_dir, exist_ok=True)
         
-        upload_info = mock_uploads[upload_id]
         filename = upload_info['filename']
         file_path = os.path.join(uploads_dir, f"{upload_id}_{filename}")
         
+        # Stream the body to disk, hashing as we go, so only one chunk is in memory
+        digest = hashlib.sha256()
+        file_size = 0
         with open(file_path, 'wb') as f:
-            f.write(file_data)
-        
-        mock_uploads[upload_id]['status'] = 'completed'
-        mock_uploads[upload_id]['localPath'] = file_path
-        mock_uploads[upload_id]['fileSize'] = len(file_data)
-        
-        logger.info(f"File saved locally: {file_path} ({len(file_data)} bytes)")
+            while chunk:
+                digest.update(chunk)
+                f.write(chunk)
+                file_size += len(chunk)
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        
+        update_upload(
+            upload_id,
+            status='completed',
+            localPath=file_path,
+            fileSize=file_size,
+            sha256=digest.hexdigest()
+        )
+        
+        logger.info(f"File saved locally: {file_path} ({file_size} bytes)")
         
         return '', 200
         
@@ -186,17 +462,18 @@ def upload_file_local(upload_id):
 @app.route('/upload-status/<upload_id>', methods=['GET'])
 def get_upload_status(upload_id):
     """Get upload status"""
-    if upload_id not in mock_uploads:
+    upload_info = mock_uploads.get(upload_id)
+    if upload_info is None:
         return jsonify({'error': 'Upload not found'}), 404
     
-    return jsonify(mock_uploads[upload_id])
+    return jsonify(upload_info)
 
 @app.route('/uploads/complete', methods=['POST'])
 def complete_upload():
     """Complete file upload and register asset"""
     try:
         logger.info("Upload completion request received")
-        data = request.get_json()
+        data = request_json()
         logger.info(f"Completion data: {data}")
         
         if not data or 'uploadId' not in data:
@@ -207,56 +484,53 @@ def complete_upload():
         creator = data.get('creator', 'anonymous')
         email = data.get('email', '')
         
-        if upload_id not in mock_uploads:
-            return jsonify({'error': 'Upload not found'}), 404
-            
         # Update upload record
-        mock_uploads[upload_id].update({
-            'status': 'completed',
-            'creator': creator,
-            'email': email,
-            'completedAt': datetime.now(timezone.utc).isoformat()
-        })
+        upload_info = update_upload(
+            upload_id,
+            status='completed',
+            creator=creator,
+            email=email,
+            completedAt=utc_now_iso_precise()
+        )
+        if upload_info is None:
+            return jsonify({'error': 'Upload not found'}), 404
         
         asset_id = f"asset_{int(time.time())}_{upload_id[:8]}"
         
         try:
-            from PIL import Image
-            import io
-            import imagehash
-            
-            file_path = f"/tmp/hatchmark-uploads/{upload_id}_{mock_uploads[upload_id]['filename']}"
+            file_path = f"/tmp/hatchmark-uploads/{upload_id}_{upload_info['filename']}"
             
             if os.path.exists(file_path):
-                with open(file_path, 'rb') as f:
-                    image = Image.open(io.BytesIO(f.read()))
-                    perceptual_hash = str(imagehash.phash(image))
+                # Let PIL read the saved upload from disk instead of copying it into memory
+                with Image.open(file_path) as image:
+                    perceptual_hash = phash_image(image)
                     print(f"Registration: Calculated perceptual hash: {perceptual_hash}")
             else:
                 print(f"Warning: File not found at {file_path}, using fallback hash")
-                perceptual_hash = f"hash_{hash(object_key + creator) % 1000000:06d}"
+                perceptual_hash = fallback_hash(object_key + creator)
         
         except Exception as e:
             print(f"Error calculating perceptual hash during registration: {e}")
-            perceptual_hash = f"hash_{hash(object_key + creator) % 1000000:06d}"
+            perceptual_hash = fallback_hash(object_key + creator)
         
-        mock_assets[perceptual_hash] = {
+        registered_at = utc_now_iso_precise()
+        register_asset(perceptual_hash, {
             'assetId': asset_id,
-            'filename': mock_uploads[upload_id]['filename'],
+            'filename': upload_info['filename'],
             'perceptualHash': perceptual_hash,
             'objectKey': object_key,
             'creator': creator,
             'email': email,
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': registered_at,
             'status': 'verified'
-        }
+        })
         
         logger.info(f"Asset registered: {asset_id} with hash: {perceptual_hash}")
         
         return jsonify({
             'assetId': asset_id,
             'perceptualHash': perceptual_hash,
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': registered_at,
             'message': 'Upload completed and asset registered'
         })
         
@@ -280,18 +554,14 @@ def check_duplicate():
         
         # Calculate perceptual hash
         try:
-            from PIL import Image
-            import io
-            import imagehash
-            
-            file_content = file.read()
-            image = Image.open(io.BytesIO(file_content))
-            perceptual_hash = str(imagehash.phash(image))
+            image = Image.open(file.stream)
+            perceptual_hash = phash_image(image)
             
             print(f"Duplicate check: Calculated hash: {perceptual_hash}")
             
-            if perceptual_hash in mock_assets:
-                existing_asset = mock_assets[perceptual_hash]
+            # One lookup against a single registry snapshot
+            existing_asset = mock_assets.get(perceptual_hash)
+            if existing_asset is not None:
                 return jsonify({
                     'isDuplicate': True,
                     'existingAsset': {
@@ -327,16 +597,16 @@ def verify_asset():
                 return jsonify({'error': 'assetId parameter required'}), 400
             
             # Search in mock assets
-            for asset_hash, asset in mock_assets.items():
-                if asset.get('assetId') == asset_id or asset.get('filename', '').lower().find(asset_id.lower()) >= 0:
-                    return jsonify({
-                        'assetId': asset['assetId'],
-                        'filename': asset.get('filename', 'unknown.jpg'),
-                        'status': 'verified',
-                        'confidence': 95,
-                        'timestamp': asset['timestamp'],
-                        'creator': asset.get('creator', 'anonymous')
-                    })
+            asset = find_asset(asset_id)
+            if asset is not None:
+                return jsonify({
+                    'assetId': asset['assetId'],
+                    'filename': asset.get('filename', 'unknown.jpg'),
+                    'status': 'verified',
+                    'confidence': 95,
+                    'timestamp': asset['timestamp'],
+                    'creator': asset.get('creator', 'anonymous')
+                })
             
             # If not found, return unknown status
             return jsonify({
@@ -357,24 +627,16 @@ def verify_asset():
                     return jsonify({'error': 'No file selected'}), 400
                 
                 if file and file.content_type.startswith('image/'):
-                    # Read file for processing
-                    file_content = file.read()
-                    file_size = len(file_content)
-                    
                     # Calculate perceptual hash of uploaded file (same as during registration)
                     try:
-                        from PIL import Image
-                        import io
-                        import imagehash
-                        
-                        # Open image and calculate perceptual hash
-                        image = Image.open(io.BytesIO(file_content))
-                        perceptual_hash = str(imagehash.phash(image))
+                        # Decode straight from the upload stream (no intermediate copy)
+                        image = Image.open(file.stream)
+                        perceptual_hash = phash_image(image)
                         
                         print(f"Verification: Calculated perceptual hash: {perceptual_hash}")
                         
-                        if perceptual_hash in mock_assets:
-                            found_asset = mock_assets[perceptual_hash]
+                        found_asset = mock_assets.get(perceptual_hash)
+                        if found_asset is not None:
                             print(f"Verification: Found matching asset: {found_asset['assetId']}")
                             
                             return jsonify({
@@ -395,7 +657,7 @@ def verify_asset():
                                 'filename': file.filename,
                                 'status': 'unknown',
                                 'confidence': 0,
-                                'timestamp': datetime.now(timezone.utc).isoformat(),
+                                'timestamp': utc_now_iso(),
                                 'creator': 'unknown',
                                 'verification_note': 'Image not found in authenticity registry'
                             })
@@ -407,7 +669,7 @@ def verify_asset():
                     return jsonify({'error': 'Please upload an image file'}), 400
             
             else:
-                data = request.get_json()
+                data = request_json()
                 if not data:
                     return jsonify({'error': 'JSON data or file required'}), 400
                 
@@ -415,44 +677,44 @@ def verify_asset():
                     asset_hash = data['hash']
                     
                     # Mock verification logic
-                    if asset_hash in mock_assets:
-                        asset = mock_assets[asset_hash]
+                    asset = mock_assets.get(asset_hash)
+                    if asset is not None:
                         return jsonify({
                             'verified': True,
                             'asset': asset,
-                            'verification_time': datetime.now(timezone.utc).isoformat()
+                            'verification_time': utc_now_iso()
                         })
                     else:
                         return jsonify({
                             'verified': False,
                             'message': 'Asset not found in registry',
-                            'verification_time': datetime.now(timezone.utc).isoformat()
+                            'verification_time': utc_now_iso()
                         })
                 
                 elif 'objectKey' in data:
                     object_key = data['objectKey']
                     
-                    mock_hash = f"hash_{hash(object_key) % 1000000:06d}"
+                    mock_hash = fallback_hash(object_key)
                     
-                    asset_id = str(uuid.uuid4())
+                    asset_id = uuid.uuid4().hex
                     asset_record = {
                         'assetId': asset_id,
                         'perceptualHash': mock_hash,
                         'objectKey': object_key,
                         'status': 'verified',
-                        'timestamp': datetime.now(timezone.utc).isoformat(),
+                        'timestamp': utc_now_iso_precise(),
                         'metadata': {
                             'source': 'local_dev',
                             'verification_method': 'object_key'
                         }
                     }
                     
-                    mock_assets[mock_hash] = asset_record
+                    register_asset(mock_hash, asset_record)
                     
                     return jsonify({
                         'verified': True,
                         'asset': asset_record,
-                        'verification_time': datetime.now(timezone.utc).isoformat()
+                        'verification_time': utc_now_iso()
                     })
                 
                 else:
@@ -464,22 +726,38 @@ def verify_asset():
 
 @app.route('/ledger', methods=['GET'])
 def get_ledger():
-    """Get ledger entries"""
-    return jsonify({
-        'assets': list(mock_assets.values()),
-        'total_count': len(mock_assets),
-        'timestamp': datetime.now(timezone.utc).isoformat()
-    })
+    """Get ledger entries (re-encoded only when the registry changes)"""
+    global _ledger_cache
+    version, body = _ledger_cache
+    if version != _ledger_version:
+        # Read the version before the snapshot so a racing write can only
+        # make us re-encode again, never cache stale assets under a new version
+        version = _ledger_version
+        assets = mock_assets
+        body = json_bytes({
+            'assets': list(assets.values()),
+            'total_count': len(assets),
+            'timestamp': utc_now_iso()
+        })
+        _ledger_cache = (version, body)
+    
+    etag = f"{_ledger_etag_prefix}-{version:x}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
 
 @app.route('/ledger', methods=['POST'])
 def add_to_ledger():
     """Add entry to ledger"""
     try:
-        data = request.get_json()
+        data = request_json()
         if not data:
             return jsonify({'error': 'JSON data required'}), 400
         
-        asset_id = str(uuid.uuid4())
+        asset_id = uuid.uuid4().hex
         
         asset_record = {
             'assetId': asset_id,
@@ -487,12 +765,12 @@ def add_to_ledger():
             'objectKey': data.get('objectKey', ''),
             'creatorId': data.get('creatorId', 'anonymous'),
             'status': 'registered',
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': utc_now_iso_precise(),
             'metadata': data.get('metadata', {})
         }
         
         if asset_record['perceptualHash']:
-            mock_assets[asset_record['perceptualHash']] = asset_record
+            register_asset(asset_record['perceptualHash'], asset_record)
         
         return jsonify({
             'success': True,
@@ -509,40 +787,34 @@ def add_to_ledger():
 def process_asset():
     """Process asset (compute hash and add to ledger)"""
     try:
-        data = request.get_json()
+        data = request_json()
         if not data or 'objectKey' not in data:
             return jsonify({'error': 'objectKey is required'}), 400
         
         object_key = data['objectKey']
         
-        # Extract upload_id from object_key (format: uploads/{upload_id}/{filename})
-        import re
-        match = re.search(r'uploads/([^/]+)/', object_key)
-        upload_id = match.group(1) if match else None
+        # Resolve the upload this object key was issued for (if any)
+        upload_id = upload_ids_by_object_key.get(object_key)
         
         image_data = None
         
         # Try to get from local file first (for development)
-        if upload_id and upload_id in mock_uploads:
-            upload_info = mock_uploads[upload_id]
-            if 'localPath' in upload_info:
-                try:
-                    with open(upload_info['localPath'], 'rb') as f:
-                        image_data = f.read()
-                    logger.info(f"Using local file: {upload_info['localPath']}")
-                except Exception as e:
-                    logger.warning(f"Failed to read local file: {e}")
+        upload_info = mock_uploads.get(upload_id) if upload_id else None
+        if upload_info is not None and 'localPath' in upload_info:
+            try:
+                with open(upload_info['localPath'], 'rb') as f:
+                    image_data = f.read()
+                logger.info(f"Using local file: {upload_info['localPath']}")
+            except Exception as e:
+                logger.warning(f"Failed to read local file: {e}")
         
         # Fallback to S3 if local file not found
         if not image_data:
-            session = get_aws_session()
-            if not session:
+            s3_client = get_s3_client()
+            if not s3_client:
                 return jsonify({'error': 'No local file and AWS session failed'}), 500
             
-            s3_client = session.client('s3')
-            
             try:
-                # Download the image
                 response = s3_client.get_object(Bucket=INGESTION_BUCKET, Key=object_key)
                 image_data = response['Body'].read()
                 logger.info(f"Using S3 file: s3://{INGESTION_BUCKET}/{object_key}")
@@ -553,27 +825,18 @@ def process_asset():
         if not image_data:
             return jsonify({'error': 'No image data found'}), 404
             
-        # Compute perceptual hash
-        import imagehash
-        from PIL import Image
-        import io
-        
-        image = Image.open(io.BytesIO(image_data))
-        perceptual_hash = str(imagehash.phash(image))
+        # Compute perceptual hash off the request thread
+        perceptual_hash = compute_phash(image_data)
         
         # Add to ledger (DynamoDB)
-        session = get_aws_session()
-        if session:
+        ledger_writer = get_ledger_writer()
+        if ledger_writer:
             try:
-                import boto3
-                dynamodb = session.resource('dynamodb')
-                table = dynamodb.Table('hatchmark-assets')
-                
-                asset_id = str(uuid.uuid4())
-                timestamp = datetime.now(timezone.utc).isoformat()
+                asset_id = uuid.uuid4().hex
+                timestamp = utc_now_iso_precise()
                 
-                # Add to DynamoDB
-                table.put_item(Item={
+                # Add to DynamoDB (batched with other in-flight registrations)
+                ledger_writer.put_item({
                     'assetId': asset_id,
                     'perceptualHash': perceptual_hash,
                     'objectKey': object_key,
@@ -601,11 +864,11 @@ def process_asset():
             processed_key = object_key.replace('uploads/', 'watermarked/')
             return jsonify({
                 'success': True,
-                'assetId': 'local-' + str(uuid.uuid4()),
+                'assetId': 'local-' + uuid.uuid4().hex,
                 'perceptualHash': perceptual_hash,
                 'originalKey': object_key,
                 'processedKey': processed_key,
-                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'timestamp': utc_now_iso_precise(),
                 'watermark_applied': True
             })
         
@@ -627,4 +890,12 @@ if __name__ == '__main__':
     print("  POST /ledger")
     print("  POST /process")
     
-    app.run(host='0.0.0.0', port=3002, debug=True)
+    if os.getenv('USE_DEV_SERVER'):
+        # Werkzeug reloader/debugger; slower, only for interactive debugging
+        app.run(host='0.0.0.0', port=3002, debug=True)
+    elif GEVENT_AVAILABLE:
+        from gevent.pywsgi import WSGIServer
+        print("Serving with gevent WSGI server")
+        WSGIServer(('0.0.0.0', 3002), app).serve_forever()
+    else:
+        app.run(host='0.0.0.0', port=3002, threaded=True)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Hatchmark Local Development Server - WSGI launcher
+Runs local_dev_server:app under gunicorn instead of the Werkzeug dev server
+
+The mock registry lives in process memory, so requests for one upload must
+reach the same process: concurrency comes from one gevent worker (or
+threads when gevent is not installed) rather than multiple workers.
+"""
+
+import os
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+
+
+class HatchmarkServer(BaseApplication):
+    """Minimal gunicorn application wrapping local_dev_server"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from local_dev_server import app
+        return app
+
+
+def build_options():
+    """Build gunicorn settings from the environment"""
+    try:
+        import gevent  # noqa: F401
+        worker_class = 'gevent'
+    except ImportError:
+        worker_class = 'gthread'
+
+    return {
+        'bind': os.getenv('BIND', '0.0.0.0:3002'),
+        'workers': int(os.getenv('WEB_CONCURRENCY', '1')),
+        'worker_class': worker_class,
+        'worker_connections': 1000,
+        'threads': multiprocessing.cpu_count() * 2,
+        'keepalive': 5,
+    }
+
+
+if __name__ == '__main__':
+    options = build_options()
+    print(f"Starting Hatchmark Local Development Server on {options['bind']} "
+          f"({options['worker_class']} worker)")
+    HatchmarkServer(options).run()
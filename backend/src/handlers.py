@@ -3,17 +3,110 @@ import boto3
 import os
 import uuid
 import io
-from datetime import datetime, timedelta
+import hmac
+import hashlib
+import base64
+from email import policy
+from email.parser import BytesParser
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
 from botocore.exceptions import ClientError
 from PIL import Image
 import imagehash
 
 # Initialize AWS clients
-s3_client = boto3.client('s3')
+session = boto3.session.Session()
+s3_client = session.client('s3')
 dynamodb = boto3.resource('dynamodb')
 stepfunctions = boto3.client('stepfunctions')
 sqs = boto3.client('sqs')
 
+# Response headers shared by every API Gateway response
+_PREFLIGHT_CORS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS'
+}
+_JSON_CORS = {'Content-Type': 'application/json', **_PREFLIGHT_CORS}
+
+# SigV4 presigning for the single PUT shape generate_presigned_url issues.
+# handlers.py is packaged on its own (deploy-lambda.sh copies just this file),
+# so it keeps its own copy of handlers/s3_presign.py under the same names;
+# change both together.
+SIGNED_HEADERS = 'content-type;host'
+_signing_keys = {}
+
+def new_upload_id():
+    """
+    Random RFC 4122 version 4 UUID string, formatted straight from os.urandom
+    without going through the uuid.UUID constructor
+    """
+    raw = bytearray(os.urandom(16))
+    raw[6] = (raw[6] & 0x0F) | 0x40  # version 4
+    raw[8] = (raw[8] & 0x3F) | 0x80  # RFC 4122 variant
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+def _signing_key(secret_key, date_stamp, region):
+    """Derive (and cache per day) the SigV4 signing key for S3"""
+    cache_key = (secret_key, date_stamp, region)
+    key = _signing_keys.get(cache_key)
+    if key is None:
+        key = hmac.new(f"AWS4{secret_key}".encode(), date_stamp.encode(), hashlib.sha256).digest()
+        for part in (region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        _signing_keys.clear()
+        _signing_keys[cache_key] = key
+    return key
+
+def presign_put(bucket, object_key, content_type, expires):
+    """
+    Build a presigned PUT URL with a local SigV4 computation, falling back to
+    botocore when the bucket cannot be addressed virtual-host style or no
+    credentials are available.
+    """
+    credentials = session.get_credentials()
+    if credentials is None or '.' in bucket:
+        return s3_client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': bucket, 'Key': object_key, 'ContentType': content_type},
+            ExpiresIn=expires,
+            HttpMethod='PUT'
+        )
+    
+    credentials = credentials.get_frozen_credentials()
+    region = s3_client.meta.region_name
+    host = f"{bucket}.s3.{region}.amazonaws.com"
+    amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = amz_date[:8]
+    scope = f"{date_stamp}/{region}/s3/aws4_request"
+    
+    params = {
+        'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+        'X-Amz-Credential': f"{credentials.access_key}/{scope}",
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expires),
+        'X-Amz-SignedHeaders': SIGNED_HEADERS,
+    }
+    if credentials.token:
+        params['X-Amz-Security-Token'] = credentials.token
+    query = '&'.join(f"{k}={quote(v, safe='-_.~')}" for k, v in sorted(params.items()))
+    path = '/' + quote(object_key, safe='/-_.~')
+    
+    canonical_request = (
+        f"PUT\n{path}\n{query}\n"
+        f"content-type:{content_type}\nhost:{host}\n\n"
+        f"{SIGNED_HEADERS}\nUNSIGNED-PAYLOAD"
+    )
+    string_to_sign = (
+        f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+        f"{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+    )
+    signature = hmac.new(
+        _signing_key(credentials.secret_key, date_stamp, region), string_to_sign.encode(), hashlib.sha256
+    ).hexdigest()
+    return f"https://{host}{path}?{query}&X-Amz-Signature={signature}"
+
 def generate_presigned_url(event, context):
     """
     Lambda function to generate a presigned URL for S3 upload.
@@ -27,12 +120,7 @@ def generate_presigned_url(event, context):
         if not filename:
             return {
                 'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'POST, OPTIONS'
-                },
+                'headers': _JSON_CORS,
                 'body': json.dumps({'error': 'filename is required'})
             }
         
@@ -41,37 +129,22 @@ def generate_presigned_url(event, context):
         if not bucket_name:
             return {
                 'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': _JSON_CORS,
                 'body': json.dumps({'error': 'S3 bucket not configured'})
             }
         
         # Generate unique key for the upload
-        unique_id = str(uuid.uuid4())
-        file_extension = filename.split('.')[-1] if '.' in filename else ''
+        unique_id = new_upload_id()
+        dot = filename.rfind('.')
+        file_extension = filename[dot + 1:] if dot >= 0 else ''
         s3_key = f"uploads/{unique_id}.{file_extension}" if file_extension else f"uploads/{unique_id}"
         
         # Generate presigned URL for PUT operation (15 minutes expiry)
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': s3_key,
-                'ContentType': 'image/*'
-            },
-            ExpiresIn=900  # 15 minutes
-        )
+        presigned_url = presign_put(bucket_name, s3_key, 'image/*', 900)  # 15 minutes
         
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS'
-            },
+            'headers': _JSON_CORS,
             'body': json.dumps({
                 'uploadUrl': presigned_url,
                 's3Key': s3_key,
@@ -83,10 +156,7 @@ def generate_presigned_url(event, context):
         print(f"Error generating presigned URL: {str(e)}")
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': _JSON_CORS,
             'body': json.dumps({'error': 'Internal server error'})
         }
 
@@ -154,6 +224,7 @@ def write_to_ledger(event, context):
         table = dynamodb.Table(table_name)
         
         # Write to DynamoDB
+        now = datetime.utcnow()
         item = {
             'assetId': asset_id,
             'perceptualHash': perceptual_hash,
@@ -162,8 +233,8 @@ def write_to_ledger(event, context):
             'timestamp': timestamp,
             'status': 'REGISTERED',
             'imageSize': image_size,
-            'createdAt': datetime.utcnow().isoformat(),
-            'TTL': int((datetime.utcnow() + timedelta(days=365*10)).timestamp())  # 10 year retention
+            'createdAt': now.isoformat(),
+            'TTL': int((now + timedelta(days=365*10)).timestamp())  # 10 year retention
         }
         
         table.put_item(Item=item)
@@ -200,6 +271,24 @@ def write_to_ledger(event, context):
         raise e
 
 
+def _parse_multipart_image(body, content_type):
+    """
+    Return the uploaded image from a multipart/form-data body, or None.
+    
+    The stdlib MIME parser splits the parts in one pass instead of
+    materializing a list of every part.
+    """
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body
+    )
+    if not message.is_multipart():
+        return None
+    for part in message.iter_parts():
+        if part.get_content_type().startswith('image/') or part.get_filename():
+            return Image.open(io.BytesIO(part.get_payload(decode=True)))
+    return None
+
+
 def verify_artwork(event, context):
     """
     Lambda function to verify artwork authenticity.
@@ -210,38 +299,35 @@ def verify_artwork(event, context):
         if event.get('httpMethod') == 'OPTIONS':
             return {
                 'statusCode': 200,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'POST, OPTIONS'
-                },
+                'headers': _PREFLIGHT_CORS,
                 'body': ''
             }
         
         # Parse multipart form data for file upload
-        content_type = event.get('headers', {}).get('content-type', '')
+        headers = event.get('headers') or {}
+        content_type = headers.get('content-type') or headers.get('Content-Type', '')
         
         if 'multipart/form-data' in content_type:
             # Extract uploaded file from multipart data
-            # This is a simplified implementation - in production use proper multipart parser
-            body = event.get('body', '')
+            body = event.get('body') or ''
             if event.get('isBase64Encoded'):
-                import base64
                 body = base64.b64decode(body)
+            elif isinstance(body, str):
+                body = body.encode()
             
-            # For now, we'll need to implement proper multipart parsing
-            # or use a library like python-multipart
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Multipart parsing not yet implemented'})
-            }
-        
-        # Handle JSON verification (by hash or asset ID)
-        body = json.loads(event.get('body', '{}'))
+            image = _parse_multipart_image(body, content_type)
+            if image is None:
+                return {
+                    'statusCode': 400,
+                    'headers': _JSON_CORS,
+                    'body': json.dumps({'error': 'No image file found in upload'})
+                }
+            
+            # Verify by the uploaded image's hash (same hash compute_phash registers)
+            body = {'perceptualHash': str(imagehash.phash(image))}
+        else:
+            # Handle JSON verification (by hash or asset ID)
+            body = json.loads(event.get('body', '{}'))
         
         if 'perceptualHash' in body:
             perceptual_hash = body['perceptualHash']
@@ -260,10 +346,7 @@ def verify_artwork(event, context):
                 asset = response['Items'][0]
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': _JSON_CORS,
                     'body': json.dumps({
                         'verdict': 'VERIFIED',
                         'assetId': asset['assetId'],
@@ -275,10 +358,7 @@ def verify_artwork(event, context):
             else:
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': _JSON_CORS,
                     'body': json.dumps({
                         'verdict': 'NOT_REGISTERED',
                         'confidence': 'HIGH',
@@ -299,10 +379,7 @@ def verify_artwork(event, context):
                     asset = response['Item']
                     return {
                         'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
+                        'headers': _JSON_CORS,
                         'body': json.dumps({
                             'verdict': 'VERIFIED',
                             'assetId': asset['assetId'],
@@ -315,10 +392,7 @@ def verify_artwork(event, context):
                 else:
                     return {
                         'statusCode': 404,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
+                        'headers': _JSON_CORS,
                         'body': json.dumps({
                             'verdict': 'NOT_FOUND',
                             'message': 'Asset ID not found in registry'
@@ -328,20 +402,14 @@ def verify_artwork(event, context):
                 print(f"DynamoDB error: {e}")
                 return {
                     'statusCode': 500,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': _JSON_CORS,
                     'body': json.dumps({'error': 'Database error'})
                 }
         
         else:
             return {
                 'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': _JSON_CORS,
                 'body': json.dumps({'error': 'perceptualHash or assetId required'})
             }
         
@@ -349,9 +417,6 @@ def verify_artwork(event, context):
         print(f"Error in verification: {str(e)}")
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': _JSON_CORS,
             'body': json.dumps({'error': 'Internal server error'})
         }
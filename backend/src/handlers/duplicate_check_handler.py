@@ -1,19 +1,33 @@
-import json
+import orjson
 import boto3
 import base64
 import io
+import re
+import numpy as np
 from PIL import Image
-import imagehash
 import os
 from boto3.dynamodb.conditions import Key
 
+from image_hashing import prepare_for_hashing, compute_phash, pack_hashes, hamming_distances
+
+# Initialize boto3 resource and table once per container
+dynamodb = boto3.resource('dynamodb')
+table_name = os.environ['ASSETS_TABLE']
+table = dynamodb.Table(table_name)
+
+# 64-bit hashes (hash_size=8), compared up to this many differing bits
+DUPLICATE_HASH_SIZE = 8
+SIMILAR_MAX_DISTANCE = 5
+_HEX_HASH = re.compile('[0-9a-fA-F]+')
+
+
 def lambda_handler(event, context):
     """
     Lambda function to check for duplicate images based on perceptual hash
     """
     try:
         # Parse the incoming request
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(event.get('body', '{}'))
         
         # Handle base64 encoded file from frontend
         if 'fileData' in body:
@@ -26,24 +40,23 @@ def lambda_handler(event, context):
                     'Access-Control-Allow-Headers': 'Content-Type,Authorization',
                     'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
                 },
-                'body': json.dumps({
+                'body': orjson.dumps({
                     'error': 'No file data provided'
-                })
+                }).decode()
             }
         
         # Calculate perceptual hash
-        image = Image.open(io.BytesIO(file_data))
-        phash = str(imagehash.phash(image))
+        # Convert to single-channel luma once so the resize never touches
+        # colour channels it discards
+        image = prepare_for_hashing(Image.open(io.BytesIO(file_data)))
+        phash = str(compute_phash(image, hash_size=DUPLICATE_HASH_SIZE))
         
         # Check DynamoDB for existing assets with similar hash
-        dynamodb = boto3.resource('dynamodb')
-        table_name = os.environ['ASSETS_TABLE']
-        table = dynamodb.Table(table_name)
-        
         # Query the PerceptualHashIndex for exact matches
         response = table.query(
             IndexName='PerceptualHashIndex',
-            KeyConditionExpression=Key('perceptualHash').eq(phash)
+            KeyConditionExpression=Key('perceptualHash').eq(phash),
+            Limit=1
         )
         
         if response['Items']:
@@ -56,7 +69,7 @@ def lambda_handler(event, context):
                     'Access-Control-Allow-Headers': 'Content-Type,Authorization',
                     'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
                 },
-                'body': json.dumps({
+                'body': orjson.dumps({
                     'isDuplicate': True,
                     'perceptualHash': phash,
                     'existingAsset': {
@@ -65,7 +78,7 @@ def lambda_handler(event, context):
                         'timestamp': existing_asset.get('timestamp', ''),
                         'originalFilename': existing_asset.get('originalFilename', 'Unknown')
                     }
-                })
+                }).decode()
             }
         
         # Check for similar hashes (Hamming distance <= 5)
@@ -74,25 +87,26 @@ def lambda_handler(event, context):
             ProjectionExpression='assetId, perceptualHash, creator, timestamp, originalFilename'
         )
         
+        # Only well-formed hashes of the same size can be compared bit-for-bit
+        candidates = [
+            asset for asset in all_assets_response['Items']
+            if len(asset.get('perceptualHash', '')) == len(phash)
+            and _HEX_HASH.fullmatch(asset['perceptualHash'])
+        ]
+        
         similar_assets = []
-        for asset in all_assets_response['Items']:
-            if 'perceptualHash' in asset:
-                try:
-                    existing_hash = imagehash.hex_to_hash(asset['perceptualHash'])
-                    current_hash = imagehash.hex_to_hash(phash)
-                    hamming_distance = current_hash - existing_hash
-                    
-                    if hamming_distance <= 5:  # Similar image threshold
-                        similar_assets.append({
-                            'assetId': asset['assetId'],
-                            'creator': asset.get('creator', 'Unknown'),
-                            'timestamp': asset.get('timestamp', ''),
-                            'originalFilename': asset.get('originalFilename', 'Unknown'),
-                            'similarity': hamming_distance
-                        })
-                except Exception as e:
-                    # Skip invalid hashes
-                    continue
+        if candidates:
+            stored = pack_hashes([asset['perceptualHash'] for asset in candidates], DUPLICATE_HASH_SIZE)
+            distances = hamming_distances(phash, stored)
+            for index in np.flatnonzero(distances <= SIMILAR_MAX_DISTANCE):
+                asset = candidates[index]
+                similar_assets.append({
+                    'assetId': asset['assetId'],
+                    'creator': asset.get('creator', 'Unknown'),
+                    'timestamp': asset.get('timestamp', ''),
+                    'originalFilename': asset.get('originalFilename', 'Unknown'),
+                    'similarity': int(distances[index])
+                })
         
         if similar_assets:
             return {
@@ -102,12 +116,12 @@ def lambda_handler(event, context):
                     'Access-Control-Allow-Headers': 'Content-Type,Authorization',
                     'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
                 },
-                'body': json.dumps({
+                'body': orjson.dumps({
                     'isDuplicate': True,
                     'perceptualHash': phash,
                     'existingAsset': similar_assets[0],  # Return the most similar one
                     'similarAssets': similar_assets
-                })
+                }).decode()
             }
         
         # No duplicates found
@@ -118,10 +132,10 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Headers': 'Content-Type,Authorization',
                 'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'isDuplicate': False,
                 'perceptualHash': phash
-            })
+            }).decode()
         }
         
     except Exception as e:
@@ -133,7 +147,7 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Headers': 'Content-Type,Authorization',
                 'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'error': f'Internal server error: {str(e)}'
-            })
+            }).decode()
         }
@@ -1,4 +1,4 @@
-import json
+import orjson
 import boto3
 import uuid
 from datetime import datetime
@@ -19,7 +19,8 @@ def lambda_handler(event, context):
     Store asset metadata and perceptual hash in DynamoDB
     """
     try:
-        logger.info(f"Received event: {json.dumps(event)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Received event: {orjson.dumps(event).decode()}")
         
         # Extract data from the event (coming from hash function)
         bucket = event.get('bucket')
@@ -50,7 +51,8 @@ def lambda_handler(event, context):
             response = table.query(
                 IndexName='PerceptualHashIndex',
                 KeyConditionExpression='perceptualHash = :hash',
-                ExpressionAttributeValues={':hash': perceptual_hash}
+                ExpressionAttributeValues={':hash': perceptual_hash},
+                Limit=1
             )
             
             if response['Items']:
@@ -1,20 +1,37 @@
 import boto3
-import json
+import orjson
 import os
 import logging
-import uuid
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer, Metrics
 from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.metrics import MetricUnit
+from s3_presign import new_upload_id, presign_put
 
 # Initialize AWS Lambda Powertools
 logger = Logger()
 tracer = Tracer()
 metrics = Metrics()
 
-# Initialize boto3 client
-s3_client = boto3.client('s3')
+# Initialize boto3 session and client
+session = boto3.session.Session()
+s3_client = session.client('s3')
+
+# CORS headers for all responses
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Allow-Methods": "POST, OPTIONS",
+    "Content-Type": "application/json"
+}
+
+# Accepted upload types; the set is checked per request, the tuple keeps message order
+ALLOWED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff')
+ALLOWED_EXTENSION_SET = frozenset(ALLOWED_EXTENSIONS)
+ALLOWED_EXTENSIONS_MESSAGE = f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+
+URL_EXPIRY_SECONDS = 600
+
 
 @logger.inject_lambda_context(correlation_id_path=correlation_paths.API_GATEWAY_HTTP)
 @tracer.capture_lambda_handler
@@ -40,14 +57,6 @@ def lambda_handler(event, context):
     }
     """
     
-    # CORS headers for all responses
-    cors_headers = {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Content-Type",
-        "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Content-Type": "application/json"
-    }
-    
     try:
         # Get environment variables
         ingestion_bucket = os.environ.get('INGESTION_BUCKET')
@@ -55,18 +64,18 @@ def lambda_handler(event, context):
             logger.error("INGESTION_BUCKET environment variable not set")
             return {
                 "statusCode": 500,
-                "headers": cors_headers,
-                "body": json.dumps({
+                "headers": CORS_HEADERS,
+                "body": orjson.dumps({
                     "error": "Internal server configuration error",
                     "message": "Storage bucket not configured"
-                })
+                }).decode()
             }
         
         # Handle CORS preflight requests
         if event.get('httpMethod') == 'OPTIONS':
             return {
                 "statusCode": 200,
-                "headers": cors_headers,
+                "headers": CORS_HEADERS,
                 "body": ""
             }
         
@@ -75,24 +84,24 @@ def lambda_handler(event, context):
             logger.warning("Empty request body received")
             return {
                 "statusCode": 400,
-                "headers": cors_headers,
-                "body": json.dumps({
+                "headers": CORS_HEADERS,
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Request body is required"
-                })
+                }).decode()
             }
         
         try:
-            body = json.loads(event['body'])
-        except json.JSONDecodeError as e:
+            body = orjson.loads(event['body'])
+        except orjson.JSONDecodeError as e:
             logger.warning(f"Invalid JSON in request body: {str(e)}")
             return {
                 "statusCode": 400,
-                "headers": cors_headers,
-                "body": json.dumps({
+                "headers": CORS_HEADERS,
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Invalid JSON format"
-                })
+                }).decode()
             }
         
         # Validate filename
@@ -101,46 +110,43 @@ def lambda_handler(event, context):
             logger.warning("Missing or empty filename in request")
             return {
                 "statusCode": 400,
-                "headers": cors_headers,
-                "body": json.dumps({
+                "headers": CORS_HEADERS,
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Filename is required and cannot be empty"
-                })
+                }).decode()
             }
         
         # Sanitize filename and validate file extension
         filename = filename.strip()
-        allowed_extensions = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff']
         file_extension = os.path.splitext(filename.lower())[1]
         
-        if file_extension not in allowed_extensions:
+        if file_extension not in ALLOWED_EXTENSION_SET:
             logger.warning(f"Unsupported file extension: {file_extension}")
             return {
                 "statusCode": 400,
-                "headers": cors_headers,
-                "body": json.dumps({
+                "headers": CORS_HEADERS,
+                "body": orjson.dumps({
                     "error": "Bad Request",
-                    "message": f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
-                })
+                    "message": ALLOWED_EXTENSIONS_MESSAGE
+                }).decode()
             }
         
         # Generate unique object key to prevent collisions
         # Pattern: uploads/{uuid4()}/{original_filename}
-        unique_id = str(uuid.uuid4())
+        unique_id = new_upload_id()
         object_key = f"uploads/{unique_id}/{filename}"
         
         logger.info(f"Generating presigned URL for object: {object_key}")
         
-        # Generate presigned URL for PUT operation
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': ingestion_bucket,
-                'Key': object_key,
-                'ContentType': f'image/{file_extension[1:]}' if file_extension != '.jpg' else 'image/jpeg'
-            },
-            ExpiresIn=600,  # 10 minutes
-            HttpMethod='PUT'
+        # Generate presigned URL for PUT operation (10 minutes)
+        presigned_url = presign_put(
+            session,
+            s3_client,
+            ingestion_bucket,
+            object_key,
+            f'image/{file_extension[1:]}' if file_extension != '.jpg' else 'image/jpeg',
+            URL_EXPIRY_SECONDS
         )
         
         # Log success metrics
@@ -151,15 +157,15 @@ def lambda_handler(event, context):
         response_body = {
             "uploadUrl": presigned_url,
             "objectKey": object_key,
-            "expiresIn": 600,
+            "expiresIn": URL_EXPIRY_SECONDS,
             "filename": filename,
             "assetId": unique_id
         }
         
         return {
             "statusCode": 200,
-            "headers": cors_headers,
-            "body": json.dumps(response_body)
+            "headers": CORS_HEADERS,
+            "body": orjson.dumps(response_body).decode()
         }
         
     except ClientError as e:
@@ -171,12 +177,12 @@ def lambda_handler(event, context):
         
         return {
             "statusCode": 500,
-            "headers": cors_headers,
-            "body": json.dumps({
+            "headers": CORS_HEADERS,
+            "body": orjson.dumps({
                 "error": "Internal Server Error",
                 "message": "Failed to generate upload URL",
                 "code": error_code
-            })
+            }).decode()
         }
         
     except Exception as e:
@@ -185,9 +191,9 @@ def lambda_handler(event, context):
         
         return {
             "statusCode": 500,
-            "headers": cors_headers,
-            "body": json.dumps({
+            "headers": CORS_HEADERS,
+            "body": orjson.dumps({
                 "error": "Internal Server Error",
                 "message": "An unexpected error occurred"
-            })
+            }).decode()
         }
\ No newline at end of file
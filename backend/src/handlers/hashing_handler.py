@@ -1,15 +1,17 @@
 import boto3
-import json
+import orjson
 import os
 import logging
-import io
+import shutil
+import tempfile
 from urllib.parse import unquote_plus
 from PIL import Image
-import imagehash
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer, Metrics
 from aws_lambda_powertools.metrics import MetricUnit
 
+from image_hashing import prepare_for_hashing, compute_phash, compute_ahash, compute_dhash
+
 # Initialize AWS Lambda Powertools
 logger = Logger()
 tracer = Tracer()
@@ -18,6 +20,10 @@ metrics = Metrics()
 # Initialize boto3 clients
 s3_client = boto3.client('s3')
 
+# Images up to this size are spooled in memory; larger ones spill to /tmp
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
 def lambda_handler(event, context):
@@ -42,7 +48,8 @@ def lambda_handler(event, context):
     """
     
     try:
-        logger.info(f"Received event: {json.dumps(event)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Received event: {orjson.dumps(event).decode()}")
         
         # Parse S3 event - handle both S3 event and direct invocation
         if 'Records' in event:
@@ -64,10 +71,15 @@ def lambda_handler(event, context):
         # Download image from S3 into memory
         try:
             response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-            image_data = response['Body'].read()
+            
+            # Spool the body in chunks: small images stay in memory, large ones
+            # spill to /tmp instead of being held as one bytes object
+            image_buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            shutil.copyfileobj(response['Body'], image_buffer, DOWNLOAD_CHUNK_SIZE)
             
             # Get file size
-            file_size = len(image_data)
+            file_size = image_buffer.tell()
+            image_buffer.seek(0)
             logger.info(f"Downloaded image size: {file_size} bytes")
             
         except ClientError as e:
@@ -80,7 +92,6 @@ def lambda_handler(event, context):
         
         # Open image with PIL
         try:
-            image_buffer = io.BytesIO(image_data)
             image = Image.open(image_buffer)
             
             # Get image metadata
@@ -94,26 +105,25 @@ def lambda_handler(event, context):
             
             logger.info(f"Image metadata: {image_metadata}")
             
-            # Convert to RGB if necessary (for consistent hashing)
-            if image.mode != 'RGB':
-                logger.info(f"Converting image from {image.mode} to RGB")
-                image = image.convert('RGB')
+            # All three hashes work on one reduced-scale luminance decode;
+            # metadata above still reports the original size and mode
+            image = prepare_for_hashing(image)
             
         except Exception as e:
             logger.error(f"Failed to process image: {str(e)}")
             raise ValueError(f"Invalid image file: {str(e)}")
         
-        # Compute perceptual hash using imagehash
+        # Compute perceptual hash
         try:
             # Use phash (perceptual hash) - most robust for duplicate detection
-            phash = imagehash.phash(image, hash_size=16)  # 256-bit hash
+            phash = compute_phash(image)  # 256-bit hash
             phash_string = str(phash)
             
             logger.info(f"Computed perceptual hash: {phash_string}")
             
             # Also compute additional hashes for comparison
-            ahash = str(imagehash.average_hash(image, hash_size=16))
-            dhash = str(imagehash.dhash(image, hash_size=16))
+            ahash = str(compute_ahash(image))
+            dhash = str(compute_dhash(image))
             
             metrics.add_metric(name="ImageHashComputed", unit=MetricUnit.Count, value=1)
             
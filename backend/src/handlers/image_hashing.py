@@ -0,0 +1,97 @@
+"""
+Image hashing shared by hashing_handler (registration), verification_handler
+and duplicate_check_handler
+
+Both sides must produce identical hashes for the same image, so the decode
+settings and hash kernels live here rather than in either handler.
+"""
+
+import numpy as np
+from PIL import Image
+import imagehash
+
+# pHash parameters (hash values match imagehash.phash(image, hash_size=16))
+PHASH_SIZE = 16
+PHASH_IMG_SIZE = PHASH_SIZE * 4
+
+
+def _dct_matrix(n, rows):
+    """First `rows` rows of the unnormalized DCT-II matrix (scipy.fftpack.dct default)"""
+    k = np.arange(rows, dtype=np.float64)[:, None]
+    i = np.arange(n, dtype=np.float64)[None, :]
+    return 2.0 * np.cos(np.pi * k * (2.0 * i + 1.0) / (2.0 * n))
+
+
+# Only the low-frequency block is kept, so only those rows are needed; bases
+# for other hash sizes are built once on first use
+_phash_dct = {PHASH_SIZE: _dct_matrix(PHASH_IMG_SIZE, PHASH_SIZE)}
+
+
+def prepare_for_hashing(image):
+    """
+    Decode an opened image to the grayscale pixels every hash works from
+    
+    The image is decoded at full resolution and converted to 'L' once, exactly
+    as imagehash does, so stored ledger hashes stay bit-identical. (A reduced
+    scale JPEG draft decode is faster but shifts some hashes by a few bits,
+    which the exact PerceptualHashIndex lookups would miss.)
+    """
+    if image.mode != 'L':
+        image = image.convert('L')
+    return image
+
+
+def _thumbnail_pixels(image, size, dtype=None):
+    """
+    Resize a grayscale image straight to hash size and return its pixels
+    
+    imagehash calls convert('L') first, which copies the full-size image even
+    when it is already grayscale; prepare_for_hashing converts once, so skip that.
+    """
+    if image.mode != 'L':
+        image = image.convert('L')
+    return np.asarray(image.resize(size, Image.LANCZOS), dtype=dtype)
+
+
+def compute_phash(image, hash_size=PHASH_SIZE):
+    """
+    Perceptual hash equivalent to imagehash.phash(image, hash_size)
+    
+    The separable 2-D DCT is done as two matrix products against a precomputed
+    basis, computing just the low-frequency block (16x16 by default) instead of
+    the full transform.
+    """
+    basis = _phash_dct.get(hash_size)
+    if basis is None:
+        basis = _phash_dct[hash_size] = _dct_matrix(hash_size * 4, hash_size)
+    
+    img_size = hash_size * 4
+    pixels = _thumbnail_pixels(image, (img_size, img_size), np.float64)
+    low_freq = basis @ pixels @ basis.T
+    return imagehash.ImageHash(low_freq > np.median(low_freq))
+
+
+def compute_ahash(image):
+    """Average hash equivalent to imagehash.average_hash(image, hash_size=16)"""
+    pixels = _thumbnail_pixels(image, (PHASH_SIZE, PHASH_SIZE))
+    return imagehash.ImageHash(pixels > np.mean(pixels))
+
+
+def compute_dhash(image):
+    """Difference hash equivalent to imagehash.dhash(image, hash_size=16)"""
+    pixels = _thumbnail_pixels(image, (PHASH_SIZE + 1, PHASH_SIZE))
+    return imagehash.ImageHash(pixels[:, 1:] > pixels[:, :-1])
+
+
+def pack_hashes(hex_hashes, hash_size=PHASH_SIZE):
+    """Pack hex hashes of one size into rows of uint64 words for hamming_distances"""
+    packed = np.frombuffer(bytes.fromhex(''.join(hex_hashes)), dtype=np.uint64)
+    return packed.reshape(len(hex_hashes), hash_size * hash_size // 64)
+
+
+def hamming_distances(query_hash, packed):
+    """Hamming distance from a hex query_hash to each packed hash row, in one vectorized pass"""
+    xored = packed ^ np.frombuffer(bytes.fromhex(query_hash), dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0
+        return np.bitwise_count(xored).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(xored.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
@@ -1,9 +1,10 @@
 import boto3
-import json
+import orjson
 import os
 import logging
 from datetime import datetime, timezone
 import uuid
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer, Metrics
 from aws_lambda_powertools.metrics import MetricUnit
@@ -13,8 +14,15 @@ logger = Logger()
 tracer = Tracer()
 metrics = Metrics()
 
-# Initialize boto3 client
-dynamodb = boto3.resource('dynamodb')
+# Initialize boto3 client and table once per container; keep-alive holds the
+# pooled connection open across warm invocations, and retries stay bounded so a
+# throttled write fails fast back to the state machine
+dynamodb = boto3.resource(
+    'dynamodb',
+    config=Config(tcp_keepalive=True, retries={'max_attempts': 3, 'mode': 'standard'})
+)
+table_name = os.environ.get('DYNAMODB_TABLE', 'hatchmark-assets')
+table = dynamodb.Table(table_name)
 
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
@@ -40,11 +48,8 @@ def lambda_handler(event, context):
     """
     
     try:
-        logger.info(f"Received event: {json.dumps(event)}")
-        
-        # Get table name from environment
-        table_name = os.environ.get('DYNAMODB_TABLE', 'hatchmark-assets')
-        table = dynamodb.Table(table_name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Received event: {orjson.dumps(event).decode()}")
         
         # Extract required data from event
         perceptual_hash = event.get('perceptualHash')
@@ -71,7 +76,8 @@ def lambda_handler(event, context):
             response = table.query(
                 IndexName='PerceptualHashIndex',
                 KeyConditionExpression='perceptualHash = :hash',
-                ExpressionAttributeValues={':hash': perceptual_hash}
+                ExpressionAttributeValues={':hash': perceptual_hash},
+                Limit=1
             )
             
             if response['Items']:
@@ -169,4 +175,4 @@ def lambda_handler(event, context):
     except Exception as e:
         logger.error(f"Unexpected error in ledger recording: {str(e)}")
         metrics.add_metric(name="LedgerUnexpectedError", unit=MetricUnit.Count, value=1)
-        raise e
\ No newline at end of file
+        raise e
\ No newline at end of file
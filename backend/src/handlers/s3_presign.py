@@ -0,0 +1,92 @@
+"""
+Upload ids and SigV4 presigning for the upload handlers
+
+The legacy backend/src/handlers.py is packaged without this directory, so it
+keeps a copy of these functions under the same names; change both together.
+"""
+
+import os
+import hmac
+import hashlib
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+SIGNED_HEADERS = "content-type;host"
+
+# One signing key per (secret, day, region); keys roll over at UTC midnight
+_signing_keys = {}
+
+
+def new_upload_id():
+    """
+    Random RFC 4122 version 4 UUID string, formatted straight from os.urandom
+    without going through the uuid.UUID constructor
+    """
+    raw = bytearray(os.urandom(16))
+    raw[6] = (raw[6] & 0x0F) | 0x40  # version 4
+    raw[8] = (raw[8] & 0x3F) | 0x80  # RFC 4122 variant
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _signing_key(secret_key, date_stamp, region):
+    """Derive (and cache per day) the SigV4 signing key for S3"""
+    cache_key = (secret_key, date_stamp, region)
+    key = _signing_keys.get(cache_key)
+    if key is None:
+        key = hmac.new(f"AWS4{secret_key}".encode(), date_stamp.encode(), hashlib.sha256).digest()
+        for part in (region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        _signing_keys.clear()
+        _signing_keys[cache_key] = key
+    return key
+
+
+def presign_put(session, s3_client, bucket, object_key, content_type, expires):
+    """
+    Build a presigned PUT URL with a local SigV4 computation
+    
+    Falls back to botocore for bucket names that cannot be addressed
+    virtual-host style or when the session has no credentials.
+    """
+    credentials = session.get_credentials()
+    if credentials is None or '.' in bucket:
+        return s3_client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': bucket, 'Key': object_key, 'ContentType': content_type},
+            ExpiresIn=expires,
+            HttpMethod='PUT'
+        )
+    
+    credentials = credentials.get_frozen_credentials()
+    region = s3_client.meta.region_name
+    host = f"{bucket}.s3.{region}.amazonaws.com"
+    amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = amz_date[:8]
+    scope = f"{date_stamp}/{region}/s3/aws4_request"
+    
+    params = {
+        'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+        'X-Amz-Credential': f"{credentials.access_key}/{scope}",
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expires),
+        'X-Amz-SignedHeaders': SIGNED_HEADERS,
+    }
+    if credentials.token:
+        params['X-Amz-Security-Token'] = credentials.token
+    query = '&'.join(f"{k}={quote(v, safe='-_.~')}" for k, v in sorted(params.items()))
+    path = '/' + quote(object_key, safe='/-_.~')
+    
+    canonical_request = (
+        f"PUT\n{path}\n{query}\n"
+        f"content-type:{content_type}\nhost:{host}\n\n"
+        f"{SIGNED_HEADERS}\nUNSIGNED-PAYLOAD"
+    )
+    string_to_sign = (
+        f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+        f"{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+    )
+    signature = hmac.new(
+        _signing_key(credentials.secret_key, date_stamp, region), string_to_sign.encode(), hashlib.sha256
+    ).hexdigest()
+    return f"https://{host}{path}?{query}&X-Amz-Signature={signature}"
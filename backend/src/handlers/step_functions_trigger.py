@@ -4,18 +4,34 @@ Step Functions Trigger Handler
 Triggers the notarization workflow when an image is uploaded to S3
 """
 
-import json
+import orjson
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
 stepfunctions = boto3.client('stepfunctions')
 
+# Executions for a multi-record S3 event are started concurrently; the pool
+# outlives invocations along with the client
+_executor = ThreadPoolExecutor(max_workers=8)
+
+def start_execution(state_machine_arn, execution_name, input_data):
+    """Start one workflow execution and return its ARN"""
+    response = stepfunctions.start_execution(
+        stateMachineArn=state_machine_arn,
+        name=execution_name,
+        input=orjson.dumps(input_data).decode()
+    )
+    return response['executionArn']
+
 def trigger_notarization_workflow(event, context):
     """
     S3 event handler that triggers Step Functions workflow
     """
     try:
+        pending = []
+        
         # Parse S3 event
         for record in event['Records']:
             s3_event = record['s3']
@@ -38,7 +54,8 @@ def trigger_notarization_workflow(event, context):
             filename = object_key.split('/')[-1]
             
             # Start Step Functions execution
-            execution_name = f"notarization-{object_key.replace('/', '-')}-{int(datetime.utcnow().timestamp())}"
+            now = datetime.utcnow()
+            execution_name = f"notarization-{object_key.replace('/', '-')}-{int(now.timestamp())}"
             
             input_data = {
                 "Records": [{
@@ -48,20 +65,28 @@ def trigger_notarization_workflow(event, context):
                     }
                 }],
                 "originalFilename": filename,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": now.isoformat()
             }
             
-            response = stepfunctions.start_execution(
-                stateMachineArn=state_machine_arn,
-                name=execution_name,
-                input=json.dumps(input_data)
-            )
-            
-            print(f"Started execution: {response['executionArn']}")
+            pending.append(_executor.submit(start_execution, state_machine_arn, execution_name, input_data))
+        
+        # Wait for every start: Lambda freezes the container on return, and a
+        # failed start must still fail the invocation so S3 retries the event
+        wait(pending)
+        first_error = None
+        for future in pending:
+            error = future.exception()
+            if error is None:
+                print(f"Started execution: {future.result()}")
+            else:
+                print(f"Failed to start execution: {str(error)}")
+                first_error = first_error or error
+        if first_error is not None:
+            raise first_error
             
         return {
             'statusCode': 200,
-            'body': json.dumps('Workflow triggered successfully')
+            'body': orjson.dumps('Workflow triggered successfully').decode()
         }
         
     except Exception as e:
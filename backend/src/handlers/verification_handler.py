@@ -1,22 +1,141 @@
 import boto3
-import json
+import orjson
 import os
 import logging
 import io
+import time
+import base64
+import hashlib
+import tempfile
+import numpy as np
 from PIL import Image
-import imagehash
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Tracer, Metrics
 from aws_lambda_powertools.metrics import MetricUnit
 
+from image_hashing import prepare_for_hashing, compute_phash, pack_hashes, hamming_distances
+
 # Initialize AWS Lambda Powertools
 logger = Logger()
 tracer = Tracer()
 metrics = Metrics()
 
-# Initialize boto3 clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+# Initialize boto3 clients and table once per container; keep-alive holds pooled
+# connections open across warm invocations
+_client_config = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={'max_attempts': 3, 'mode': 'standard'}
+)
+dynamodb = boto3.resource('dynamodb', config=_client_config)
+s3_client = boto3.client('s3', config=_client_config)
+table_name = os.environ.get('DYNAMODB_TABLE', 'hatchmark-assets')
+table = dynamodb.Table(table_name)
+
+# 256-bit perceptual hashes (hash_size=16), packed as four uint64 words
+HASH_BITS = 256
+HASH_HEX_LENGTH = HASH_BITS // 4
+SIMILARITY_THRESHOLD = 0.85
+
+# The similarity scan only needs ids and hashes; the full item is fetched
+# for the single asset that clears the threshold
+SCAN_PROJECTION = 'assetId, perceptualHash'
+
+# Images fetched from S3 up to this size are spooled in memory; larger ones
+# spill to /tmp instead of being held as one bytes object
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Warm containers remember recent verifications. Hashes per image content never
+# go stale; verdicts and exact-match lookups expire quickly so new
+# registrations show up.
+# Lambda runs one invocation per container at a time, so no locking is needed.
+CACHE_MAX_ENTRIES = 1024
+EXACT_MATCH_TTL_SECONDS = 60
+LEDGER_SNAPSHOT_TTL_SECONDS = 60
+VERDICT_TTL_SECONDS = 60
+_phash_by_content = {}
+_verdict_by_content = {}
+_exact_match_cache = {}
+_ledger_snapshot = None  # (loaded_at, asset ids, packed hashes)
+
+
+def _cache_put(cache, key, value):
+    """Insert into a bounded cache, evicting the oldest entry when full"""
+    cache[key] = value
+    if len(cache) > CACHE_MAX_ENTRIES:
+        cache.pop(next(iter(cache)))
+
+
+def verdict_response(content_key, cors_headers, verdict, cache=True):
+    """200 response carrying a verdict, remembered per image content for retries"""
+    body = orjson.dumps(verdict).decode()
+    if cache:
+        _verdict_by_content.pop(content_key, None)
+        _cache_put(_verdict_by_content, content_key, (time.monotonic(), body))
+    return {
+        "statusCode": 200,
+        "headers": cors_headers,
+        "body": body
+    }
+
+
+def find_exact_match(query_hash):
+    """Look up the asset registered with exactly this hash (or None), cached briefly"""
+    now = time.monotonic()
+    cached = _exact_match_cache.get(query_hash)
+    if cached is not None and now - cached[0] < EXACT_MATCH_TTL_SECONDS:
+        return cached[1]
+    
+    response = table.query(
+        IndexName='PerceptualHashIndex',
+        KeyConditionExpression='perceptualHash = :hash',
+        ExpressionAttributeValues={':hash': query_hash},
+        Limit=1
+    )
+    asset = response['Items'][0] if response['Items'] else None
+    _exact_match_cache.pop(query_hash, None)
+    _cache_put(_exact_match_cache, query_hash, (now, asset))
+    return asset
+
+
+def load_ledger_hashes():
+    """Asset ids and packed hashes of every comparable asset, rescanned at most once per TTL"""
+    global _ledger_snapshot
+    now = time.monotonic()
+    if _ledger_snapshot is not None and now - _ledger_snapshot[0] < LEDGER_SNAPSHOT_TTL_SECONDS:
+        return _ledger_snapshot[1], _ledger_snapshot[2]
+    
+    asset_ids, hashes = [], []
+    scan_kwargs = {'ProjectionExpression': SCAN_PROJECTION}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response['Items']:
+            # Hashes of another size cannot be compared bit-for-bit
+            if len(item.get('perceptualHash', '')) == HASH_HEX_LENGTH:
+                asset_ids.append(item['assetId'])
+                hashes.append(item['perceptualHash'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    packed = pack_hashes(hashes)
+    _ledger_snapshot = (now, asset_ids, packed)
+    return asset_ids, packed
+
+
+def download_image(bucket, key):
+    """Stream an S3 object into a spooled file, returning it with its content digest"""
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    digest = hashlib.blake2b(digest_size=16)
+    image_buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    for chunk in response['Body'].iter_chunks(DOWNLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+        image_buffer.write(chunk)
+    image_buffer.seek(0)
+    return image_buffer, digest.digest()
+
 
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
@@ -69,37 +188,33 @@ def lambda_handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": cors_headers,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Request body is required"
-                })
+                }).decode()
             }
         
         try:
-            body = json.loads(event['body'])
-        except json.JSONDecodeError:
+            body = orjson.loads(event['body'])
+        except orjson.JSONDecodeError:
             return {
                 "statusCode": 400,
                 "headers": cors_headers,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Invalid JSON format"
-                })
+                }).decode()
             }
         
-        # Get DynamoDB table
-        table_name = os.environ.get('DYNAMODB_TABLE', 'hatchmark-assets')
-        table = dynamodb.Table(table_name)
-        
         # Load image from different sources
         image = None
         image_source = "unknown"
         
         if 'imageData' in body:
             # Base64 encoded image
-            import base64
             try:
                 image_data = base64.b64decode(body['imageData'])
+                content_key = hashlib.blake2b(image_data, digest_size=16).digest()
                 image = Image.open(io.BytesIO(image_data))
                 image_source = "base64"
             except Exception as e:
@@ -107,92 +222,99 @@ def lambda_handler(event, context):
                 return {
                     "statusCode": 400,
                     "headers": cors_headers,
-                    "body": json.dumps({
+                    "body": orjson.dumps({
                         "error": "Bad Request",
                         "message": "Invalid base64 image data"
-                    })
+                    }).decode()
                 }
         
         elif 's3Bucket' in body and 's3Key' in body:
-            # S3 object
+            # S3 object - preferred for large images, which skip the base64
+            # inflation and the invocation payload limit entirely
             try:
-                response = s3_client.get_object(Bucket=body['s3Bucket'], Key=body['s3Key'])
-                image_data = response['Body'].read()
-                image = Image.open(io.BytesIO(image_data))
+                image_buffer, content_key = download_image(body['s3Bucket'], body['s3Key'])
+                image = Image.open(image_buffer)
                 image_source = f"s3://{body['s3Bucket']}/{body['s3Key']}"
             except Exception as e:
                 logger.error(f"Failed to load S3 image: {str(e)}")
                 return {
                     "statusCode": 400,
                     "headers": cors_headers,
-                    "body": json.dumps({
+                    "body": orjson.dumps({
                         "error": "Bad Request",
                         "message": "Failed to load image from S3"
-                    })
+                    }).decode()
                 }
         
         else:
             return {
                 "statusCode": 400,
                 "headers": cors_headers,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Either imageData (base64) or s3Bucket+s3Key must be provided"
-                })
+                }).decode()
             }
         
         if not image:
             return {
                 "statusCode": 400,
                 "headers": cors_headers,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "error": "Bad Request",
                     "message": "Failed to load image"
-                })
+                }).decode()
             }
         
-        logger.info(f"Processing verification for image from: {image_source}")
+        logger.info("Processing verification", extra={"imageSource": image_source})
         
-        # Convert to RGB for consistent hashing
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Identical bytes verified moments ago (UI retries, re-submits) get the
+        # same verdict back without decoding, hashing or querying again
+        cached = _verdict_by_content.get(content_key)
+        if cached is not None and time.monotonic() - cached[0] < VERDICT_TTL_SECONDS:
+            logger.info("Returning cached verdict for identical image content")
+            metrics.add_metric(name="VerificationCacheHit", unit=MetricUnit.Count, value=1)
+            return {
+                "statusCode": 200,
+                "headers": cors_headers,
+                "body": cached[1]
+            }
         
-        # Compute perceptual hash
-        query_hash = str(imagehash.phash(image, hash_size=16))
-        logger.info(f"Computed hash for verification: {query_hash}")
+        # Retried verifications of the same bytes skip decoding and hashing
+        query_hash = _phash_by_content.get(content_key)
+        
+        if query_hash is None:
+            # Decode and hash exactly as hashing_handler does at registration time
+            image = prepare_for_hashing(image)
+            
+            # Compute perceptual hash
+            query_hash = str(compute_phash(image))
+            _cache_put(_phash_by_content, content_key, query_hash)
+        logger.info("Computed hash for verification", extra={"perceptualHash": query_hash})
         
         # Search for exact match first
         try:
-            response = table.query(
-                IndexName='PerceptualHashIndex',
-                KeyConditionExpression='perceptualHash = :hash',
-                ExpressionAttributeValues={':hash': query_hash}
-            )
+            asset = find_exact_match(query_hash)
             
-            if response['Items']:
+            if asset is not None:
                 # Exact match found
-                asset = response['Items'][0]
-                logger.info(f"Exact match found: {asset['assetId']}")
+                logger.info("Exact match found", extra={"assetId": asset['assetId']})
                 
                 metrics.add_metric(name="VerificationExactMatch", unit=MetricUnit.Count, value=1)
                 
-                return {
-                    "statusCode": 200,
-                    "headers": cors_headers,
-                    "body": json.dumps({
-                        "isAuthentic": True,
-                        "confidence": 1.0,
-                        "matchType": "exact",
-                        "assetId": asset['assetId'],
-                        "registrationDate": asset['timestamp'],
-                        "originalFilename": asset.get('originalFilename', 'unknown'),
-                        "details": {
-                            "hashMatch": query_hash,
-                            "status": asset.get('status', 'unknown'),
-                            "imageMetadata": asset.get('metadata', {})
-                        }
-                    })
-                }
+                return verdict_response(content_key, cors_headers, {
+                    "isAuthentic": True,
+                    "confidence": 1.0,
+                    "matchType": "exact",
+                    "assetId": asset['assetId'],
+                    "registrationDate": asset['timestamp'],
+                    "originalFilename": asset.get('originalFilename', 'unknown'),
+                    "details": {
+                        "hashMatch": query_hash,
+                        "status": asset.get('status', 'unknown'),
+                        "imageMetadata": asset.get('metadata', {})
+                    }
+                })
             
         except ClientError as e:
             logger.error(f"Error querying DynamoDB: {str(e)}")
@@ -200,89 +322,89 @@ def lambda_handler(event, context):
             return {
                 "statusCode": 500,
                 "headers": cors_headers,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "error": "Internal Server Error",
                     "message": "Failed to verify image"
-                })
+                }).decode()
             }
         
         # No exact match found - check for similar images
         logger.info("No exact match found, checking for similar images")
         
-        # Scan for similar hashes (this is expensive but needed for fuzzy matching)
-        # In production, you'd want to optimize this with better indexing strategies
+        # Compare against the container's snapshot of ledger hashes, so most
+        # unregistered images are decided without touching DynamoDB; only a
+        # match that clears the threshold costs a read of the full item
+        searched_assets = 0
+        search_failed = False
         try:
-            response = table.scan()
-            similar_assets = []
+            asset_ids, stored_hashes = load_ledger_hashes()
+            searched_assets = len(asset_ids)
+            best_match = None
             
-            query_hash_int = int(query_hash, 16)
-            
-            for item in response['Items']:
-                stored_hash = item['perceptualHash']
-                stored_hash_int = int(stored_hash, 16)
+            if asset_ids:
+                # Calculate Hamming distance against every candidate at once
+                distances = hamming_distances(query_hash, stored_hashes)
                 
-                # Calculate Hamming distance
-                hamming_distance = bin(query_hash_int ^ stored_hash_int).count('1')
-                similarity = 1.0 - (hamming_distance / 256.0)  # 256 bits total
+                # Only the closest asset is reported, so pick it directly
+                # (first one wins on ties) instead of sorting every match
+                index = int(np.argmin(distances))
+                similarity = 1.0 - distances[index] / float(HASH_BITS)
                 
-                if similarity > 0.85:  # 85% similarity threshold
-                    similar_assets.append({
-                        "asset": item,
-                        "similarity": similarity,
-                        "hammingDistance": hamming_distance
-                    })
-            
-            if similar_assets:
-                # Sort by similarity
-                similar_assets.sort(key=lambda x: x['similarity'], reverse=True)
-                best_match = similar_assets[0]
+                asset = None
+                if similarity > SIMILARITY_THRESHOLD:
+                    asset = table.get_item(Key={'assetId': asset_ids[index]}).get('Item')
                 
-                logger.info(f"Similar match found: {best_match['asset']['assetId']} with {best_match['similarity']:.2f} similarity")
+                if asset:
+                    best_match = {
+                        "asset": asset,
+                        "similarity": float(similarity),
+                        "hammingDistance": int(distances[index])
+                    }
+            
+            if best_match:
+                logger.info("Similar match found", extra={
+                    "assetId": best_match['asset']['assetId'],
+                    "similarity": best_match['similarity']
+                })
                 
                 metrics.add_metric(name="VerificationSimilarMatch", unit=MetricUnit.Count, value=1)
                 
-                return {
-                    "statusCode": 200,
-                    "headers": cors_headers,
-                    "body": json.dumps({
-                        "isAuthentic": True,
-                        "confidence": best_match['similarity'],
-                        "matchType": "similar",
-                        "assetId": best_match['asset']['assetId'],
-                        "registrationDate": best_match['asset']['timestamp'],
-                        "originalFilename": best_match['asset'].get('originalFilename', 'unknown'),
-                        "details": {
-                            "queryHash": query_hash,
-                            "matchedHash": best_match['asset']['perceptualHash'],
-                            "hammingDistance": best_match['hammingDistance'],
-                            "similarity": best_match['similarity'],
-                            "status": best_match['asset'].get('status', 'unknown')
-                        }
-                    })
-                }
+                return verdict_response(content_key, cors_headers, {
+                    "isAuthentic": True,
+                    "confidence": best_match['similarity'],
+                    "matchType": "similar",
+                    "assetId": best_match['asset']['assetId'],
+                    "registrationDate": best_match['asset']['timestamp'],
+                    "originalFilename": best_match['asset'].get('originalFilename', 'unknown'),
+                    "details": {
+                        "queryHash": query_hash,
+                        "matchedHash": best_match['asset']['perceptualHash'],
+                        "hammingDistance": best_match['hammingDistance'],
+                        "similarity": best_match['similarity'],
+                        "status": best_match['asset'].get('status', 'unknown')
+                    }
+                })
             
         except Exception as e:
             logger.error(f"Error during similarity search: {str(e)}")
+            search_failed = True
             # Continue to return "not authentic" rather than error
         
         # No match found
         logger.info("No matching asset found in ledger")
         metrics.add_metric(name="VerificationNoMatch", unit=MetricUnit.Count, value=1)
         
-        return {
-            "statusCode": 200,
-            "headers": cors_headers,
-            "body": json.dumps({
-                "isAuthentic": False,
-                "confidence": 0.0,
-                "matchType": "none",
-                "message": "No matching asset found in authenticity ledger",
-                "details": {
-                    "queryHash": query_hash,
-                    "searchedAssets": response.get('Count', 0) if 'response' in locals() else 0
-                }
-            })
-        }
+        # A verdict reached after a failed search is not worth repeating
+        return verdict_response(content_key, cors_headers, {
+            "isAuthentic": False,
+            "confidence": 0.0,
+            "matchType": "none",
+            "message": "No matching asset found in authenticity ledger",
+            "details": {
+                "queryHash": query_hash,
+                "searchedAssets": searched_assets
+            }
+        }, cache=not search_failed)
         
     except Exception as e:
         logger.error(f"Unexpected error in verification: {str(e)}")
@@ -291,8 +413,8 @@ def lambda_handler(event, context):
         return {
             "statusCode": 500,
             "headers": cors_headers,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "error": "Internal Server Error",
                 "message": "An unexpected error occurred during verification"
-            })
-        }
\ No newline at end of file
+            }).decode()
+        }
\ No newline at end of file
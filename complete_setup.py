@@ -115,12 +115,13 @@ def setup_dynamodb_table():
                     {'AttributeName': 'assetId', 'AttributeType': 'S'},
                     {'AttributeName': 'perceptualHash', 'AttributeType': 'S'}
                 ],
+                # The index is created with the table (same name as template.yaml,
+                # which the handlers query) so no follow-up update_table is needed
                 GlobalSecondaryIndexes=[
                     {
-                        'IndexName': 'perceptualHash-index',
+                        'IndexName': 'PerceptualHashIndex',
                         'KeySchema': [{'AttributeName': 'perceptualHash', 'KeyType': 'HASH'}],
-                        'Projection': {'ProjectionType': 'ALL'},
-                        'BillingMode': 'PAY_PER_REQUEST'
+                        'Projection': {'ProjectionType': 'ALL'}
                     }
                 ],
                 BillingMode='PAY_PER_REQUEST'
@@ -131,9 +132,9 @@ def setup_dynamodb_table():
             waiter.wait(TableName=table_name)
             
             # Enable point-in-time recovery
-            dynamodb.put_backup_policy(
+            dynamodb.update_continuous_backups(
                 TableName=table_name,
-                BackupPolicy={'PointInTimeRecoveryEnabled': True}
+                PointInTimeRecoverySpecification={'PointInTimeRecoveryEnabled': True}
             )
             
             print(f"Created DynamoDB table: {table_name}")
@@ -9,23 +9,23 @@ import boto3
 import json
 import time
 import io
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import sys
 
+# Parsed once and reused by every generated test image
+try:
+    DEFAULT_FONT = ImageFont.load_default()
+except Exception:
+    DEFAULT_FONT = None
+
 def create_test_image():
     """Create a simple test image."""
     # Create a small RGB image
     img = Image.new('RGB', (200, 200), color='blue')
     
     # Add some text to make it unique
-    from PIL import ImageDraw, ImageFont
     draw = ImageDraw.Draw(img)
-    try:
-        font = ImageFont.load_default()
-    except:
-        font = None
-    
-    draw.text((50, 90), "HATCHMARK TEST", fill='white', font=font)
+    draw.text((50, 90), "HATCHMARK TEST", fill='white', font=DEFAULT_FONT)
     
     # Save to bytes
     img_bytes = io.BytesIO()
@@ -9,7 +9,7 @@ import sys
 import json
 import boto3
 import uuid
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import imagehash
 from datetime import datetime
 
@@ -21,6 +21,12 @@ try:
 except ImportError:
     print("Warning: Could not import handlers. Make sure you're in the project root directory.")
 
+# Parsed once and reused by every generated test image
+try:
+    DEFAULT_FONT = ImageFont.load_default()
+except Exception:
+    DEFAULT_FONT = None
+
 def create_test_image(filename="test_image.png", size=(400, 400)):
     """Create a test image for testing purposes."""
     print(f"Creating test image: {filename}")
@@ -29,7 +35,6 @@ def create_test_image(filename="test_image.png", size=(400, 400)):
     img = Image.new('RGB', size, color='blue')
     
     # Add some patterns to make it unique
-    from PIL import ImageDraw, ImageFont
     draw = ImageDraw.Draw(img)
     
     # Draw some shapes
@@ -38,11 +43,10 @@ def create_test_image(filename="test_image.png", size=(400, 400)):
     draw.polygon([(100, 250), (200, 300), (150, 350)], fill='yellow')
     
     # Add text
-    try:
-        font = ImageFont.load_default()
+    if DEFAULT_FONT is not None:
         draw.text((50, 300), f"Hatchmark Test\n{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 
-                 fill='white', font=font)
-    except:
+                 fill='white', font=DEFAULT_FONT)
+    else:
         draw.text((50, 300), "Hatchmark Test", fill='white')
     
     # Save the image
@@ -153,6 +157,55 @@ def test_steganography():
     except Exception as e:
         print(f" Steganography test failed: {e}")
 
+def test_watermark_alpha():
+    """Test that the watermarker keeps the alpha channel of RGBA uploads."""
+    print("\n=== Testing Watermark Alpha Round-Trip ===")
+    
+    try:
+        import io
+        import numpy as np
+        
+        # The watermarker creates its AWS clients at import time
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'watermarker'))
+        from main import HatchmarkWatermarker, WATERMARK_DELIMITER
+        
+        # Semi-transparent gradient so every alpha value must survive
+        img = Image.new('RGBA', (64, 64), color=(0, 0, 255, 255))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([8, 8, 40, 40], fill=(255, 0, 0, 128))
+        img.putalpha(Image.linear_gradient('L').resize((64, 64)))
+        source = io.BytesIO()
+        img.save(source, format='PNG')
+        source.seek(0)
+        
+        asset_id = str(uuid.uuid4())
+        output, watermarked = HatchmarkWatermarker().apply_steganography_watermark(source, asset_id)
+        result = Image.open(output)
+        
+        if not watermarked:
+            print(" Watermarking fell back to the original image")
+            return
+        if result.mode != 'RGBA':
+            print(f" Alpha channel lost: output mode is {result.mode}")
+            return
+        if result.getchannel('A').tobytes() != img.getchannel('A').tobytes():
+            print(" Alpha channel changed by watermarking")
+            return
+        
+        # The asset ID comes back out of the red-plane LSBs
+        payload = np.packbits(np.array(result.getchannel('R')).reshape(-1) & 1).tobytes()
+        decoded = payload.split(WATERMARK_DELIMITER)[0].decode()
+        if decoded == asset_id:
+            print(" RGBA watermark round-trip successful")
+        else:
+            print(f" Watermark mismatch: {decoded!r}")
+        
+    except ImportError as e:
+        print(f" Watermarker dependencies not available: {e}")
+    except Exception as e:
+        print(f" Watermark alpha test failed: {e}")
+
 def test_docker_watermarker():
     """Test if Docker watermarker can be built."""
     print("\n=== Testing Docker Watermarker ===")
@@ -304,6 +357,7 @@ def main():
     test_steganography()
     test_lambda_handlers()
     test_image_similarity()
+    test_watermark_alpha()
     test_docker_watermarker()
     
     print("\n" + "=" * 50)
@@ -1,22 +1,37 @@
 import os
-import json
+import orjson
 import time
 import logging
+import shutil
+import tempfile
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+import numpy as np
 from PIL import Image
 import io
-from steganography import steganography
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# AWS clients
-s3_client = boto3.client('s3')
-sqs_client = boto3.client('sqs')
-dynamodb = boto3.resource('dynamodb')
+# boto3's per-request chatter would otherwise dominate the job logs
+for _name in ('boto3', 'botocore', 's3transfer', 'urllib3'):
+    logging.getLogger(_name).setLevel(logging.WARNING)
+
+# AWS clients, shared by every worker thread. The pool covers MAX_WORKERS jobs
+# each running a multipart upload with TRANSFER_CONFIG's concurrency.
+_client_config = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+s3_client = boto3.client('s3', config=_client_config)
+sqs_client = boto3.client('sqs', config=_client_config)
+dynamodb = boto3.resource('dynamodb', config=_client_config)
 
 # Environment variables
 SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
@@ -27,44 +42,68 @@ ASSETS_TABLE = os.environ.get('ASSETS_TABLE')
 # Initialize DynamoDB table
 table = dynamodb.Table(ASSETS_TABLE) if ASSETS_TABLE else None
 
+# Downloads up to this size are spooled in memory; larger ones spill to disk
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Large watermarked images go up as parallel multipart uploads
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=8, use_threads=True)
+
+# The poll loop waits this long for a received batch before polling again;
+# jobs still running after that delete their own message when they finish
+BATCH_TIMEOUT_SECONDS = 300
+
+# Watermark payloads end with this marker so extraction knows where to stop
+WATERMARK_DELIMITER = b'\xff\xfe'
+
+def embed_lsb(plane, message):
+    """
+    Hide message in the least significant bits of a single colour plane, one
+    bit per pixel in row-major order, with one vectorized pass over the plane
+    """
+    bits = np.unpackbits(np.frombuffer(message.encode() + WATERMARK_DELIMITER, dtype=np.uint8))
+    flat = plane.reshape(-1)  # contiguous, so a view into plane
+    if bits.size > flat.size:
+        raise ValueError(f"Image has too few pixels for a {bits.size}-bit watermark")
+    flat[:bits.size] = (flat[:bits.size] & 0xFE) | bits
+    return plane
+
 class HatchmarkWatermarker:
     def __init__(self):
         self.shutdown_event = threading.Event()
         self.max_workers = int(os.environ.get('MAX_WORKERS', '4'))
         
-    def apply_steganography_watermark(self, image_data, asset_id):
+    def apply_steganography_watermark(self, image_file, asset_id):
         """
-        Apply invisible watermark using steganography library
+        Apply invisible LSB watermark, decoding and re-encoding in memory.
+        Returns (file object positioned at the start of the output, whether it
+        was watermarked); on failure that is the untouched original upload.
         """
         try:
-            # Save image data to temporary file for steganography library
-            temp_input = f"/tmp/input_{asset_id}.png"
-            temp_output = f"/tmp/output_{asset_id}.png"
+            with Image.open(image_file) as image:
+                # Keep transparency (alpha bands, or a palette/colour key with
+                # a transparent entry) as an alpha band in the output
+                has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                mode = 'RGBA' if has_alpha else 'RGB'
+                if image.mode != mode:
+                    image = image.convert(mode)
+                red, *other_bands = image.split()
             
-            # Write input image
-            with open(temp_input, 'wb') as f:
-                f.write(image_data)
+            # Embed the asset ID as the secret message in the red plane only;
+            # green, blue and alpha go back into the merge untouched
+            red = Image.fromarray(embed_lsb(np.array(red), asset_id), 'L')
             
-            # Use steganography library to embed the asset ID as secret message
-            steganography.encode(temp_input, temp_output, asset_id)
-            
-            # Read the watermarked image
-            with open(temp_output, 'rb') as f:
-                watermarked_data = f.read()
-            
-            # Clean up temporary files
-            try:
-                os.remove(temp_input)
-                os.remove(temp_output)
-            except:
-                pass
-            
-            return watermarked_data
+            # PNG keeps the embedded LSBs intact (a lossy re-encode would not)
+            output = io.BytesIO()
+            Image.merge(mode, (red, *other_bands)).save(output, format='PNG')
+            output.seek(0)
+            return output, True
             
         except Exception as e:
-            logger.error(f"Error applying steganography watermark: {str(e)}")
+            logger.error("Error applying steganography watermark: %s", e)
             # Fallback to original image if watermarking fails
-            return image_data
+            image_file.seek(0)
+            return image_file, False
     
     def process_file(self, message_body):
         """
@@ -73,7 +112,7 @@ class HatchmarkWatermarker:
         try:
             # Parse message
             if isinstance(message_body, str):
-                data = json.loads(message_body)
+                data = orjson.loads(message_body)
             else:
                 data = message_body
             
@@ -83,37 +122,50 @@ class HatchmarkWatermarker:
             if not all([asset_id, object_key]):
                 raise ValueError(f"Missing required fields in message: {data}")
             
-            logger.info(f"Processing file: {object_key} for asset: {asset_id}")
+            logger.info("Processing file: %s for asset: %s", object_key, asset_id)
             
-            # Download file from S3 ingestion bucket
+            # Download file from S3 ingestion bucket, spooling the body in chunks
+            # rather than holding it as one bytes object; PIL needs a seekable
+            # file, which the HTTP stream is not
             response = s3_client.get_object(Bucket=INGESTION_BUCKET, Key=object_key)
-            image_data = response['Body'].read()
+            image_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            shutil.copyfileobj(response['Body'], image_file, DOWNLOAD_CHUNK_SIZE)
+            image_file.seek(0)
             
             # Apply steganography watermark
-            watermarked_data = self.apply_steganography_watermark(image_data, asset_id)
+            watermarked_data, watermarked = self.apply_steganography_watermark(image_file, asset_id)
             
-            # Generate output key for processed bucket
-            file_extension = object_key.split('.')[-1] if '.' in object_key else 'png'
+            # Generate output key for processed bucket; watermarked output is
+            # always PNG, the fallback keeps the original format
+            if watermarked:
+                file_extension = 'png'
+            else:
+                dot = object_key.rfind('.')
+                file_extension = object_key[dot + 1:] if dot >= 0 else 'png'
             output_key = f"watermarked/{asset_id}.{file_extension}"
             
-            # Upload watermarked file to processed bucket
-            s3_client.put_object(
-                Bucket=PROCESSED_BUCKET,
-                Key=output_key,
-                Body=watermarked_data,
-                ContentType=f'image/{file_extension}',
-                Metadata={
-                    'asset-id': asset_id,
-                    'watermarked': 'true',
-                    'original-key': object_key
-                }
+            # Upload watermarked file to processed bucket; the original bytes go
+            # up as-is (not re-encoded) when watermarking fell back
+            s3_client.upload_fileobj(
+                watermarked_data,
+                PROCESSED_BUCKET,
+                output_key,
+                ExtraArgs={
+                    'ContentType': f'image/{file_extension}',
+                    'Metadata': {
+                        'asset-id': asset_id,
+                        'watermarked': 'true' if watermarked else 'false',
+                        'original-key': object_key
+                    }
+                },
+                Config=TRANSFER_CONFIG
             )
             
-            logger.info(f"Successfully processed asset: {asset_id}")
+            logger.info("Successfully processed asset: %s", asset_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error processing file: {str(e)}")
+            logger.error("Error processing file: %s", e)
             raise e
     
     def update_asset_status(self, asset_id, status, additional_data=None):
@@ -145,13 +197,13 @@ class HatchmarkWatermarker:
             )
             
         except Exception as e:
-            logger.error(f"Error updating asset status: {str(e)}")
+            logger.error("Error updating asset status: %s", e)
     
     def poll_sqs_messages(self):
         """
         Poll SQS for messages and process them
         """
-        logger.info(f"Starting SQS polling on queue: {SQS_QUEUE_URL}")
+        logger.info("Starting SQS polling on queue: %s", SQS_QUEUE_URL)
         
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             while not self.shutdown_event.is_set():
@@ -168,49 +220,84 @@ class HatchmarkWatermarker:
                     messages = response.get('Messages', [])
                     
                     if messages:
-                        logger.info(f"Received {len(messages)} messages")
+                        logger.info("Received %d messages", len(messages))
                         
                         # Process messages concurrently
-                        futures = []
-                        for message in messages:
-                            future = executor.submit(self.process_message, message)
-                            futures.append(future)
+                        futures = {
+                            executor.submit(self.process_message, message): message
+                            for message in messages
+                        }
+                        
+                        # Delete successes as they finish, batching the ones that
+                        # finish together, so a slow job never holds finished
+                        # messages past their visibility timeout
+                        pending = set(futures)
+                        deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+                        while pending:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                break
+                            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                            processed = [futures[future] for future in done if future.result()]
+                            if processed:
+                                self.delete_messages(processed)
                         
-                        # Wait for all messages to complete
-                        for future in futures:
-                            try:
-                                future.result(timeout=300)  # 5 minute timeout per message
-                            except Exception as e:
-                                logger.error(f"Error processing message: {str(e)}")
+                        # Stop waiting on hung jobs, but still delete their
+                        # messages if they eventually succeed
+                        for future in pending:
+                            message = futures[future]
+                            logger.warning("Message %s still processing after %ds", message['MessageId'], BATCH_TIMEOUT_SECONDS)
+                            future.add_done_callback(partial(self.delete_if_processed, message))
                     else:
                         logger.debug("No messages received")
                         
                 except Exception as e:
-                    logger.error(f"Error polling SQS: {str(e)}")
+                    logger.error("Error polling SQS: %s", e)
                     time.sleep(10)  # Wait before retrying
     
     def process_message(self, message):
         """
-        Process individual SQS message
+        Process individual SQS message, returning True once it can be deleted
         """
         try:
-            receipt_handle = message['ReceiptHandle']
-            message_body = message['Body']
-            
             # Process the file
-            self.process_file(message_body)
+            self.process_file(message['Body'])
             
-            # Delete message from queue after successful processing
-            sqs_client.delete_message(
+            logger.debug("Message processed successfully")
+            return True
+            
+        except Exception as e:
+            logger.error("Error processing message: %s", e)
+            # Message will remain in queue for retry
+            return False
+    
+    def delete_if_processed(self, message, future):
+        """
+        Done-callback for a job that outlived the poll loop's wait
+        """
+        if future.result():
+            self.delete_messages([message])
+    
+    def delete_messages(self, messages):
+        """
+        Delete successfully processed messages from the queue in one batch call
+        """
+        try:
+            response = sqs_client.delete_message_batch(
                 QueueUrl=SQS_QUEUE_URL,
-                ReceiptHandle=receipt_handle
+                Entries=[
+                    {'Id': message['MessageId'], 'ReceiptHandle': message['ReceiptHandle']}
+                    for message in messages
+                ]
             )
             
-            logger.info("Message processed and deleted successfully")
+            # Undeleted messages reappear after the visibility timeout and are
+            # processed again, so failures are logged rather than raised
+            for failure in response.get('Failed', []):
+                logger.error("Error deleting message %s: %s", failure['Id'], failure.get('Message', failure['Code']))
             
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
-            # Message will remain in queue for retry
+            logger.error("Error deleting messages: %s", e)
     
     def run(self):
         """
@@ -228,7 +315,7 @@ class HatchmarkWatermarker:
             logger.info("Received shutdown signal")
             self.shutdown_event.set()
         except Exception as e:
-            logger.error(f"Fatal error: {str(e)}")
+            logger.error("Fatal error: %s", e)
             raise e
 
 if __name__ == "__main__":